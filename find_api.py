@@ -1,12 +1,138 @@
+from __future__ import annotations
+
+import argparse
+import fnmatch
 import os
+import re
+import sqlite3
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+GRADLE_CACHE_DIR = os.path.expanduser('~/.gradle/caches/modules-2/files-2.1')
+ARCHIVE_EXTENSIONS = ('.aar', '.jar')
+
+
+def archive_names(path: str) -> list[str] | None:
+    """
+    读取压缩包中央目录中的文件列表, 不解压内容
+    :return: 文件列表, 不是有效zip时返回None
+    """
+    try:
+        with zipfile.ZipFile(path, 'r') as zip_ref:
+            return zip_ref.namelist()
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f'warning: read archive fail {path}, {e}')
+        return None
+
+
+def compile_queries(queries: list[str], regex: bool = False) -> list[re.Pattern]:
+    """
+    :param queries: glob(默认)或正则表达式, glob需要匹配完整路径, 正则只需匹配部分
+    """
+    if regex:
+        return [re.compile(query) for query in queries]
+    return [re.compile(fnmatch.translate(query)) for query in queries]
+
+
+class MavenArchiveIndex:
+    """
+    压缩包文件列表缓存(SQLite), 按(路径, 大小, 修改时间)判断是否失效
+    未缓存或已变化的压缩包在进程池中并行读取
+    :param index_path: 缓存文件
+    :param max_workers: 读取压缩包的进程数, 默认cpu核数
+    """
+
+    def __init__(self, index_path: str, max_workers: int | None = None):
+        self.index_path = index_path
+        self.max_workers = max_workers
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self._conn = sqlite3.connect(index_path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS archives ('
+                           'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, names TEXT)')
+        self._conn.commit()
+
+    def scan(self, root: str, extensions: tuple[str, ...] = ARCHIVE_EXTENSIONS) -> dict[str, list[str]]:
+        """
+        :return: {压缩包路径: 文件列表}, 包含root下所有压缩包
+        """
+        root = os.path.abspath(root)
+        cached = {}
+        prefix = root.rstrip(os.sep) + os.sep
+        rows = self._conn.execute('SELECT path, size, mtime, names FROM archives '
+                                  'WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+        for path, size, mtime, names in rows:
+            if path.endswith(extensions):
+                cached[path] = (size, mtime, names)
+
+        result = {}
+        pending = []
+        for dir_path, dirs, files in os.walk(root):
+            for name in files:
+                if not name.endswith(extensions):
+                    continue
+                path = os.path.join(dir_path, name)
+                stat = os.stat(path)
+                entry = cached.pop(path, None)
+                if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                    result[path] = entry[2].split('\n') if entry[2] else []
+                else:
+                    pending.append((path, stat.st_size, stat.st_mtime_ns))
+
+        if pending:
+            print(f'archive: read {len(pending)} archives')
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                listings = executor.map(archive_names, [path for path, _, _ in pending], chunksize=32)
+                rows = []
+                for (path, size, mtime), names in zip(pending, listings):
+                    # 无效的压缩包也缓存, 文件未变化时不再重复读取
+                    result[path] = names or []
+                    rows.append((path, size, mtime, '\n'.join(names) if names is not None else None))
+            self._conn.executemany('INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?)', rows)
+        # 已删除的压缩包
+        if cached:
+            self._conn.executemany('DELETE FROM archives WHERE path = ?', [(path,) for path in cached.keys()])
+        self._conn.commit()
+        return result
+
+    def find(self, root: str, queries: list[str], regex: bool = False,
+             extensions: tuple[str, ...] = ARCHIVE_EXTENSIONS) -> list[tuple[str, str]]:
+        """
+        查找包含匹配文件的压缩包
+        :return: [(压缩包路径, 匹配的文件)]
+        """
+        patterns = compile_queries(queries, regex)
+        matches = []
+        for path, names in sorted(self.scan(root, extensions).items()):
+            for name in names:
+                if any((pattern.search(name) if regex else pattern.match(name)) for pattern in patterns):
+                    matches.append((path, name))
+        return matches
+
+    def close(self):
+        self._conn.close()
+
 
 if __name__ == '__main__':
-    file_path = '/Users/zhouzhenliang/.gradle/caches/modules-2/files-2.1'
-    for root, dirs, paths in os.walk(file_path):
-        for path in paths:
-            if path.endswith('.aar'):
-                aar_path = os.path.join(root, path)
-                with zipfile.ZipFile(aar_path, 'r') as zip_ref:
-                    if 'assets/idc.json' in zip_ref.namelist():
-                        print(aar_path)
+    parser = argparse.ArgumentParser(description='find archives containing matching entries')
+    parser.add_argument('queries', nargs='+', help='entry glob, e.g. assets/idc.json or **/*.so')
+    parser.add_argument('--root', default=GRADLE_CACHE_DIR, help='store dir or gradle cache dir')
+    parser.add_argument('--regex', action='store_true', help='queries are regular expressions')
+    parser.add_argument('--extensions', nargs='+', default=list(ARCHIVE_EXTENSIONS),
+                        help='archive extensions')
+    parser.add_argument('--index', default='.archives.db', help='archive listing cache')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes reading archives, default cpu count')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    index = MavenArchiveIndex(args.index, args.workers)
+    try:
+        results = index.find(args.root, args.queries, args.regex, tuple(args.extensions))
+    finally:
+        index.close()
+    for archive_path, entry_name in results:
+        print(f'{archive_path}: {entry_name}')
+    print(f'archive: {len(results)} matches, time={time.time() - start_time:.2f}s')
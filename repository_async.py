@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+import xml.etree.ElementTree as etree
+from collections import deque
+
+import aiohttp
+
+from repository_session import maven_host_auth
+from repository_sync import (DOWNLOAD_CHUNK_SIZE, FINGERPRINT_NAMES, NOT_FOUND_STATUS,
+                             MavenChecksumPolicy, MavenDownload, MavenDownloadFailure,
+                             MavenImplementation, MavenPartFile, MavenPom, MavenSyncer,
+                             maven_print_download, maven_verify_checksum, maven_write_checksums)
+from repository_validator import MavenValidatorStore
+from repository_version import maven_normalize_version
+
+
+class MavenAsyncEngine:
+    """
+    asyncio下载引擎: 单线程内同时进行大量metadata/pom/artifact请求,
+    网络等待与解析交错进行; 路由, 负缓存, 探测, 校验策略, 断点续传,
+    条件请求, 限速和熔断与线程池路径一致,
+    文件落盘后复用MavenImplementation的离线解析
+    :param syncer: 提供仓库源配置, 已同步节点, 依赖图锁文件和断点
+    :param max_in_flight: 同时同步的节点数上限, 默认max(syncer.max_workers, 64)
+    """
+
+    def __init__(self, syncer: MavenSyncer, max_in_flight: int | None = None):
+        self.syncer = syncer
+        self.host = syncer.host
+        self.max_in_flight = max_in_flight or max(syncer.max_workers, 64)
+        self._sessions: dict[str, aiohttp.ClientSession] = {}
+        self._host_semaphores: dict[str, asyncio.Semaphore | None] = {}
+        # {本地文件: [锁, 使用中的任务数]}, 没有任务使用时删除
+        self._file_locks: dict[str, list] = {}
+        self._node_semaphore: asyncio.Semaphore | None = None
+
+    async def sync(self, paths: list[str]):
+        self._node_semaphore = asyncio.Semaphore(self.max_in_flight)
+        frontier = deque(paths)
+        pending: dict[asyncio.Task, str] = {}
+        try:
+            while frontier or pending:
+                while frontier:
+                    node_path = frontier.popleft()
+                    # 解决依赖环
+                    if self.syncer.mark_path(node_path):
+                        pending[asyncio.create_task(self._sync_node(node_path))] = node_path
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_path = pending.pop(task)
+                    try:
+                        frontier.extend(task.result())
+                    except Exception as e:
+                        print(f'error: sync fail {node_path}, {e}')
+        finally:
+            for task in pending.keys():
+                task.cancel()
+            await self.close()
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    async def _sync_node(self, path: str) -> list[str]:
+        async with self._node_semaphore:
+            depe_paths = self.syncer.replay_node(path)
+            if depe_paths is None:
+                impl = MavenImplementation(self.host, path)
+                await self.fetch_metadata(impl.metadata_path)
+                impl.sync_metadata(False)
+                pom_path = impl.pom_path()
+                if pom_path and await self.fetch_pom(pom_path, set()):
+                    impl.sync_pom(is_download=False)
+                artifact_synced = await self.fetch_artifact(impl.pom) if impl.pom else False
+                depe_paths = self.syncer.record_node(path, impl, artifact_synced)
+        return self.syncer.next_paths(depe_paths)
+
+    async def fetch_metadata(self, metadata_path: str):
+        """
+        与MavenMetadata.sync相同: 未过期直接使用本地文件,
+        过期后条件请求, 否则完整下载
+        """
+        validator = self.host.validators.get(metadata_path)
+        modify_time = self.host.local_mtime(metadata_path)
+        if modify_time is not None and self.host.local_exists(metadata_path, verify=True):
+            if time.time() - modify_time < self.host.metadata_ttl_for(metadata_path):
+                return
+            if validator and await self._revalidate(metadata_path, validator):
+                return
+        download = await self.download_files(metadata_path)
+        if download:
+            self.host.validators.put(metadata_path, download.host['uri'], download.etag,
+                                     download.last_modified)
+
+    async def _revalidate(self, metadata_path: str, validator: dict) -> bool:
+        host = self.host.find_host(validator['uri'])
+        headers = MavenValidatorStore.headers(validator)
+        if not host or not headers:
+            return False
+        download = await self.download_file(host, metadata_path, headers)
+        if not download:
+            return False
+        if download.not_modified:
+            try:
+                os.utime(download.local_path)
+            except FileNotFoundError:
+                self.host.local_forget(metadata_path)
+                return False
+            if self.host.index:
+                self.host.index.update(metadata_path)
+        elif await self.download_checksums(host, download):
+            self.host.record_download(download)
+        else:
+            os.remove(download.local_path)
+            self.host.local_forget(metadata_path)
+            return False
+        self.host.validators.put(metadata_path, host['uri'], download.etag or validator['etag'],
+                                 download.last_modified or validator['last_modified'])
+        return True
+
+    async def fetch_pom(self, pom_path: str, chain: set[str]) -> bool:
+        """
+        确保pom及其parent链都已在本地, 之后可离线解析
+        """
+        if pom_path in chain:
+            return False
+        chain.add(pom_path)
+        if not self.host.local_exists(pom_path, verify=True) and not await self.download_files(pom_path):
+            return False
+        parent = self._parent_implementation(pom_path)
+        if parent:
+            parent_pom_path = parent.pom_path()
+            fetch_parent_pom = self.fetch_pom(parent_pom_path, chain) if parent_pom_path else asyncio.sleep(0)
+            await asyncio.gather(self.fetch_metadata(parent.metadata_path), fetch_parent_pom)
+        return True
+
+    def _parent_implementation(self, pom_path: str) -> MavenImplementation | None:
+        try:
+            root = etree.parse(os.path.join(self.host.store_dir, pom_path)).getroot()
+        except (OSError, etree.ParseError):
+            return None
+        result = re.match(r'(\{.+}).+', root.tag)
+        ns = result.group(1) if result else ''
+        parent = root.find(ns + 'parent')
+        if parent is None:
+            return None
+        values = []
+        for name in ('groupId', 'artifactId', 'version'):
+            node = parent.find(ns + name)
+            text = node.text.strip() if node is not None and node.text else ''
+            values.append(maven_normalize_version(text))
+        if not values[0] or not values[1] or '${' in ':'.join(values):
+            return None
+        return MavenImplementation(self.host, ':'.join(values))
+
+    async def fetch_artifact(self, pom: MavenPom) -> bool:
+        artifact_path = pom.maven_artifact_path()
+        if self.host.local_exists(artifact_path, verify=True):
+            return True
+        if await self.download_files(artifact_path):
+            await self.download_files(pom.maven_source_jar_path())
+            return True
+        return False
+
+    async def download_files(self, relative_path: str) -> MavenDownload | None:
+        """
+        与maven_download_files相同: 按熔断/耗时和路由排序仓库源,
+        可选探测竞速, 逐个尝试并获取校验文件
+        """
+        hosts = self.host.sessions.health.order(self.host.hosts)
+        router = self.host.router
+        hosts = router.order(hosts, relative_path)
+        race = self.host.race_hosts
+        if race > 1 and len(hosts) > 1 and not router.route(relative_path):
+            winner, missed = await self.race_hosts(hosts[:race], relative_path)
+            hosts = [host for host in hosts if host is not winner and host not in missed]
+            if winner:
+                hosts.insert(0, winner)
+        for host in hosts:
+            download = await self.download_file(host, relative_path)
+            if download:
+                if await self.download_checksums(host, download):
+                    router.hit(host, relative_path)
+                    self.host.record_download(download)
+                    return download
+                os.remove(download.local_path)
+            elif download.not_found:
+                router.miss(host, relative_path)
+        print(f'error: download fail {relative_path}')
+        self.host.local_forget(relative_path)
+        return None
+
+    async def download_checksums(self, host: dict, download: MavenDownload) -> bool:
+        relative_path = download.relative_path
+        checksum = self.host.checksum
+        if checksum.mode == MavenChecksumPolicy.ALL:
+            await asyncio.gather(*[self.download_file(host, relative_path + '.' + name)
+                                   for name in FINGERPRINT_NAMES])
+            return True
+
+        verified = None
+        for name in checksum.candidates(host):
+            sidecar = await self.download_file(host, relative_path + '.' + name)
+            if sidecar or sidecar.not_found:
+                checksum.mark(host, name, bool(sidecar))
+            if not sidecar:
+                continue
+            if not maven_verify_checksum(download, sidecar, name):
+                return False
+            verified = name
+            break
+        maven_write_checksums(download, verified)
+        return True
+
+    async def race_hosts(self, hosts: list, relative_path: str) -> tuple[dict | None, list]:
+        """
+        同时探测多个仓库源, 取最先命中的仓库源并取消其余探测
+        """
+        tasks = {asyncio.create_task(self.probe_file(host, relative_path)): host for host in hosts}
+        winner = None
+        missed = []
+        try:
+            for future in asyncio.as_completed(tasks.keys()):
+                try:
+                    status, host = await future
+                except Exception as e:
+                    print(f'probe: {relative_path} -> {e}')
+                    continue
+                if status in (200, 206):
+                    winner = host
+                    break
+                if status in NOT_FOUND_STATUS:
+                    missed.append(host)
+                    self.host.router.miss(host, relative_path)
+        finally:
+            for task in tasks.keys():
+                task.cancel()
+        print(f'probe: {relative_path} -> {winner["uri"] if winner else "none"}')
+        return winner, missed
+
+    async def probe_file(self, host: dict, relative_path: str) -> tuple[int | None, dict]:
+        """
+        :return: (响应状态码, 仓库源), 连接失败, 超时或熔断时状态码为None
+        """
+        url = os.path.join(host['uri'], relative_path)
+        async with self._host_slot(host):
+            response = await self._request(host, 'HEAD', url)
+            if response is None:
+                return None, host
+            response.release()
+            if response.status in (405, 501):
+                response = await self._request(host, 'GET', url, {'Range': 'bytes=0-0'})
+                if response is None:
+                    return None, host
+                response.release()
+            return response.status, host
+
+    async def download_file(self, host: dict, relative_path: str,
+                            headers: dict[str, str] | None = None) -> MavenDownload | MavenDownloadFailure:
+        """
+        与maven_download_file相同: 写入.part并计算摘要, 完成后原子重命名,
+        支持Range续传和条件请求
+        """
+        url = os.path.join(host['uri'], relative_path)
+        local_path = os.path.join(self.host.store_dir, relative_path)
+        entry = self._file_locks.setdefault(local_path, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._host_slot(host):
+                # .part文件的状态在持有锁之后读取
+                part = MavenPartFile(host, relative_path, url, local_path)
+                result = await self._download_part(part, headers)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._file_locks[local_path]
+        maven_print_download(host, relative_path, result)
+        return result
+
+    async def _download_part(self, part: MavenPartFile,
+                             headers: dict[str, str] | None) -> MavenDownload | MavenDownloadFailure:
+        host = part.host
+        response = await self._request(host, 'GET', part.url, part.request_headers(headers))
+        if response is None:
+            return MavenDownloadFailure()
+        async with response:
+            download = part.not_modified(response.status, response.headers)
+            if download:
+                return download
+            if part.restart(response.status):
+                response.release()
+                part = MavenPartFile(host, part.relative_path, part.url, part.local_path, False)
+                return await self._download_part(part, headers)
+            if not part.open(response.status, response.headers):
+                return MavenDownloadFailure(response.status)
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    part.write(chunk)
+                return part.finish()
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                # 保留.part文件用于下次续传
+                part.close()
+                print(f'download: {host["uri"]}{part.relative_path} -> {e!r}')
+                return MavenDownloadFailure()
+
+    async def _request(self, host: dict, method: str, url: str,
+                       headers: dict[str, str] | None = None) -> aiohttp.ClientResponse | None:
+        """
+        与MavenSessionPool.request相同的超时, 限速, 429, 重试和熔断处理
+        """
+        pool = self.host.sessions
+        if not pool.health.available(host):
+            return None
+        session = self._session(host)
+        limiter = pool.limiter(host)
+        attempt = 0
+        throttled = 0
+        while True:
+            wait_time = limiter.reserve()
+            while wait_time > 0:
+                await asyncio.sleep(wait_time)
+                wait_time = limiter.reserve()
+            start_time = time.time()
+            try:
+                response = await session.request(method, url, headers=headers, allow_redirects=True)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                delay = pool.settle(host, None, attempt, start_time)
+                if delay is None:
+                    print(f'download: {url} -> {e!r}')
+                    return None
+            else:
+                if response.status == 429:
+                    if pool.throttle(host, response.headers.get('Retry-After'), throttled) is None:
+                        # 重试次数用尽, 429不能当作成功提升速率或记录耗时
+                        return response
+                    response.release()
+                    throttled += 1
+                    continue
+                delay = pool.settle(host, response.status, attempt, start_time)
+                if delay is None:
+                    return response
+                response.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _session(self, host: dict) -> aiohttp.ClientSession:
+        uri = host['uri']
+        session = self._sessions.get(uri)
+        if session is None:
+            pool = self.host.sessions
+            auth = maven_host_auth(host)
+            connect_timeout, read_timeout = pool.timeout
+            session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(auth.username, auth.password) if auth else None,
+                connector=aiohttp.TCPConnector(limit=max(pool.pool_size, self.max_in_flight), ssl=False,
+                                               force_close=not pool.keep_alive),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout))
+            self._sessions[uri] = session
+        return session
+
+    def _host_slot(self, host: dict):
+        uri = host['uri']
+        if uri not in self._host_semaphores:
+            max_concurrency = host.get('max_concurrency', 0)
+            self._host_semaphores[uri] = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        semaphore = self._host_semaphores[uri]
+        return semaphore if semaphore else _NoSlot()
+
+
+class _NoSlot:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import re
+import time
+
+from repository_lock import MavenSyncCheckpoint
+from repository_sync import MAVEN_HOSTS, MavenChecksumPolicy, MavenHost, MavenSyncer, maven_model_cache
+
+
+def read_manifest(manifest_path: str) -> list[str]:
+    """
+    读取批量同步清单, 每行一个group:artifact:version,
+    支持#注释及syncer.sync("...")写法, 重复坐标只保留一个
+    """
+    paths: dict[str, None] = {}
+    with open(manifest_path, 'r') as file:
+        for line in file:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            result = re.search(r'["\']([^"\']+)["\']', line)
+            if result:
+                line = result.group(1)
+            paths[line] = None
+    return list(paths)
+
+
+def batch_sync(syncer: MavenSyncer, paths: list[str], checkpoint_path: str) -> dict:
+    """
+    批量同步多个根节点, 共享子图只同步一次,
+    进度写入断点文件, 中断后重新运行从断点继续
+    :return: 吞吐统计
+    """
+    key = hashlib.sha1('\n'.join(paths).encode()).hexdigest()
+    checkpoint = MavenSyncCheckpoint(checkpoint_path, key)
+    syncer.checkpoint = checkpoint
+    start_time = time.time()
+    start_bytes = syncer.host.downloaded_bytes
+    start_files = syncer.host.downloaded_files
+    try:
+        syncer.syncs(paths)
+    finally:
+        syncer.checkpoint = None
+    checkpoint.finish()
+
+    elapsed = max(time.time() - start_time, 1e-6)
+    stats = {
+        'roots': len(paths),
+        'coords': len(syncer.paths),
+        'files': syncer.host.downloaded_files - start_files,
+        'bytes': syncer.host.downloaded_bytes - start_bytes,
+        'seconds': elapsed,
+    }
+    print(f'batch: roots={stats["roots"]} coords={stats["coords"]} files={stats["files"]} '
+          f'bytes={stats["bytes"]} time={elapsed:.2f}s '
+          f'{stats["coords"] / elapsed:.2f} coords/s {stats["bytes"] / elapsed / 1024:.2f} KB/s')
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='batch sync maven coordinates from a manifest')
+    parser.add_argument('manifest', help='one group:artifact:version per line')
+    parser.add_argument('--store', default='.m', help='local store dir')
+    parser.add_argument('--workers', type=int, default=8, help='max nodes synced at the same time')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file, default <manifest>.checkpoint')
+    parser.add_argument('--no-depe', action='store_true', help='do not sync dependencies')
+    parser.add_argument('--mediation', choices=['nearest', 'highest'], default=None,
+                        help='resolve one version per module before downloading')
+    args = parser.parse_args()
+
+    host = MavenHost(hosts=MAVEN_HOSTS, store_dir=args.store, pool_size=max(args.workers, 16),
+                     checksum_mode=MavenChecksumPolicy.SINGLE)
+    batch_syncer = MavenSyncer(host, sync_depe=not args.no_depe, max_workers=args.workers, use_lock_file=True,
+                               mediation=args.mediation)
+    batch_sync(batch_syncer, read_manifest(args.manifest), args.checkpoint or args.manifest + '.checkpoint')
+    host.sessions.print_stats()
+    maven_model_cache.print_stats()
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from repository_sync import MavenChecksumPolicy, MavenHost, MavenSyncer, maven_model_cache
+
+
+def write_synthetic_repo(repo_dir: str, nodes: int, fanout: int, jar_size: int):
+    """
+    生成合成仓库: org.bench:node{i}:1 依赖 node{i*fanout+1} ... node{i*fanout+fanout}
+    """
+    for i in range(nodes):
+        artifact_id = f'node{i}'
+        version_dir = os.path.join(repo_dir, 'org', 'bench', artifact_id, '1')
+        os.makedirs(version_dir, exist_ok=True)
+        deps = ''.join(f'<dependency><groupId>org.bench</groupId><artifactId>node{j}</artifactId>'
+                       f'<version>1</version></dependency>'
+                       for j in range(i * fanout + 1, min(i * fanout + fanout, nodes - 1) + 1))
+        pom = (f'<project xmlns="http://maven.apache.org/POM/4.0.0"><modelVersion>4.0.0</modelVersion>'
+               f'<groupId>org.bench</groupId><artifactId>{artifact_id}</artifactId><version>1</version>'
+               f'<dependencies>{deps}</dependencies></project>').encode()
+        for name, data in ((f'{artifact_id}-1.pom', pom), (f'{artifact_id}-1.jar', os.urandom(jar_size))):
+            with open(os.path.join(version_dir, name), 'wb') as file:
+                file.write(data)
+            with open(os.path.join(version_dir, name + '.sha1'), 'w') as file:
+                file.write(hashlib.sha1(data).hexdigest())
+
+
+def serve_repo(repo_dir: str, latency: float) -> ThreadingHTTPServer:
+    """
+    本地HTTP仓库, 每个请求增加latency秒延迟模拟远程仓库
+    """
+
+    class Handler(SimpleHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=repo_dir, **kwargs)
+
+        def send_head(self):
+            time.sleep(latency)
+            return super().send_head()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_engine(uri: str, store_dir: str, engine: str, workers: int) -> tuple[float, int, int]:
+    """
+    :return: (耗时, 同步节点数, 下载文件数)
+    """
+    maven_model_cache.clear()
+    host = MavenHost([{'uri': uri}], store_dir, pool_size=max(workers, 16),
+                     checksum_mode=MavenChecksumPolicy.SINGLE)
+    syncer = MavenSyncer(host, max_workers=workers, engine=engine)
+    start_time = time.time()
+    syncer.sync('org.bench:node0:1')
+    elapsed = time.time() - start_time
+    host.sessions.close()
+    return elapsed, len(syncer.paths), host.downloaded_files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='thread/asyncio下载引擎对比')
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--jar-size', type=int, default=64 * 1024)
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的模拟延迟(秒)')
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='repository_benchmark_')
+    try:
+        repo_dir = os.path.join(work_dir, 'repo')
+        write_synthetic_repo(repo_dir, args.nodes, args.fanout, args.jar_size)
+        server = serve_repo(repo_dir, args.latency)
+        uri = f'http://127.0.0.1:{server.server_address[1]}/'
+        results = {}
+        for engine in (MavenSyncer.ENGINE_THREAD, MavenSyncer.ENGINE_ASYNCIO):
+            results[engine] = run_engine(uri, os.path.join(work_dir, engine), engine, args.workers)
+        server.shutdown()
+        for engine, (elapsed, num_nodes, num_files) in results.items():
+            print(f'benchmark: {engine} nodes={num_nodes} files={num_files} time={elapsed:.2f}s '
+                  f'files/s={num_files / elapsed:.1f}')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -1,16 +1,34 @@
+from __future__ import annotations
+
+import argparse
 import hashlib
+import json
 import os.path
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from repository_index import CHECKSUM_SUFFIXES, INDEX_SKIP_SUFFIXES
 
+CHECKSUM_NAMES = ('md5', 'sha1', 'sha256', 'sha512')
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
 
-def gen_check_files(path: str):
+
+def file_digests(path: str, names: tuple[str, ...] = CHECKSUM_NAMES) -> dict[str, str]:
+    """
+    按块读取文件, 一次读取同时计算多个摘要
+    """
+    hashes = {name: hashlib.new(name) for name in names}
     with open(path, 'rb') as file:
-        buffer = file.read()
-    with open(path + '.md5', 'w') as file:
-        file.write(hashlib.md5(buffer).hexdigest())
-    with open(path + '.sha1', 'w') as file:
-        file.write(hashlib.sha1(buffer).hexdigest())
-    with open(path + '.sha256', 'w') as file:
-        file.write(hashlib.sha256(buffer).hexdigest())
+        for chunk in iter(lambda: file.read(CHECKSUM_CHUNK_SIZE), b''):
+            for value in hashes.values():
+                value.update(chunk)
+    return {name: value.hexdigest() for name, value in hashes.items()}
+
+
+def gen_check_files(path: str, names: tuple[str, ...] = CHECKSUM_NAMES):
+    for name, digest in file_digests(path, names).items():
+        with open(path + '.' + name, 'w') as file:
+            file.write(digest)
 
 
 def gen_check_sum(path: str):
@@ -20,6 +38,94 @@ def gen_check_sum(path: str):
     gen_check_files(os.path.join(os.path.dirname(os.path.dirname(path)), 'maven-metadata.xml'))
 
 
+def _load_manifest(manifest_path: str) -> dict[str, list]:
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        print(f'warning: load checksum manifest fail {manifest_path}, {e}')
+        return {}
+
+
+def _save_manifest(manifest_path: str, manifest: dict[str, list]):
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def gen_check_tree(store_dir: str, max_workers: int | None = None, manifest_path: str | None = None,
+                   force: bool = False) -> dict:
+    """
+    为仓库目录下所有文件生成md5/sha1/sha256/sha512校验文件,
+    多个文件并行计算(hashlib计算时释放GIL),
+    大小和修改时间与清单一致且校验文件齐全的跳过
+    :param store_dir: 仓库根目录
+    :param max_workers: 并行数, 默认cpu核数
+    :param manifest_path: 清单文件, 默认store_dir/.checksums.json
+    :param force: 忽略清单全部重新生成
+    :return: 统计信息
+    """
+    manifest_path = manifest_path or os.path.join(store_dir, '.checksums.json')
+    manifest = {} if force else _load_manifest(manifest_path)
+    pending = []
+    result = {}
+    skipped = 0
+    for root, dirs, files in os.walk(store_dir):
+        dirs[:] = [name for name in dirs if not name.startswith('.')]
+        names = set(files)
+        for name in files:
+            if name.startswith('.') or name.endswith(CHECKSUM_SUFFIXES) or name.endswith(INDEX_SKIP_SUFFIXES):
+                continue
+            local_path = os.path.join(root, name)
+            relative_path = os.path.relpath(local_path, store_dir).replace(os.sep, '/')
+            stat = os.stat(local_path)
+            entry = [stat.st_size, stat.st_mtime_ns]
+            if manifest.get(relative_path) == entry and \
+                    all(f'{name}.{checksum}' in names for checksum in CHECKSUM_NAMES):
+                result[relative_path] = entry
+                skipped += 1
+                continue
+            pending.append((relative_path, local_path, entry))
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = [(relative_path, entry, executor.submit(gen_check_files, local_path))
+                   for relative_path, local_path, entry in pending]
+        num_bytes = 0
+        for relative_path, entry, future in futures:
+            try:
+                future.result()
+            except OSError as e:
+                print(f'error: checksum fail {relative_path}, {e}')
+                continue
+            result[relative_path] = entry
+            num_bytes += entry[0]
+    _save_manifest(manifest_path, result)
+
+    elapsed = max(time.time() - start_time, 1e-6)
+    stats = {
+        'files': len(result),
+        'hashed': len(result) - skipped,
+        'skipped': skipped,
+        'bytes': num_bytes,
+        'seconds': elapsed,
+    }
+    print(f'checksum: files={stats["files"]} hashed={stats["hashed"]} skipped={stats["skipped"]} '
+          f'bytes={stats["bytes"]} time={elapsed:.2f}s {num_bytes / elapsed / 1024 / 1024:.2f} MB/s')
+    return stats
+
+
 if __name__ == '__main__':
-    gen_check_sum(
-        '/Users/zhouzhenliang/Desktop/temp/topon-out/com/anythink/sdk/interstitial-tpn-beta/6.4.17/interstitial-tpn-beta-6.4.17.aar')
+    parser = argparse.ArgumentParser(description='generate checksum files for a store tree')
+    parser.add_argument('store', help='store dir')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='files hashed at the same time, default cpu count')
+    parser.add_argument('--manifest', default=None,
+                        help='size/mtime manifest, default <store>/.checksums.json')
+    parser.add_argument('--force', action='store_true', help='ignore manifest and regenerate all')
+    args = parser.parse_args()
+
+    gen_check_tree(args.store, args.workers, args.manifest, args.force)
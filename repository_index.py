@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+
+from repository_route import METADATA_NAME
+
+CHECKSUM_SUFFIXES = ('.md5', '.sha1', '.sha256', '.sha512')
+INDEX_SKIP_SUFFIXES = ('.tmp', '.part', '.json', '.db', '.db-wal', '.db-shm', '.db-journal')
+
+
+def maven_store_path(relative_path: str) -> str:
+    """
+    统一本地相对路径写法, 索引中使用'/'分隔
+    """
+    return relative_path.replace(os.sep, '/').strip('/')
+
+
+def maven_path_coordinate(relative_path: str) -> tuple[str, str, str]:
+    """
+    从仓库文件相对地址推导(groupId, artifactId, version), metadata文件version为空
+    """
+    parts = maven_store_path(relative_path).split('/')
+    if len(parts) > 0 and parts[-1].startswith(METADATA_NAME):
+        if len(parts) < 3:
+            return '', '', ''
+        return '.'.join(parts[:-2]), parts[-2], ''
+    if len(parts) < 4:
+        return '', '', ''
+    return '.'.join(parts[:-3]), parts[-3], parts[-2]
+
+
+class MavenStoreIndex:
+    """
+    本地仓库索引(SQLite), 记录坐标, 版本, 文件, 大小及sha1,
+    离线查询不再逐个stat文件系统
+    首次创建时全量扫描, 之后随下载增量更新; 手动改动store_dir后可调用rebuild()
+    :param store_dir: 本地存储根目录
+    :param db_path: 索引文件, 默认store_dir/.index.db
+    """
+
+    def __init__(self, store_dir: str, db_path: str | None = None):
+        self.store_dir = store_dir
+        self.db_path = db_path or os.path.join(store_dir, '.index.db')
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        is_new = not os.path.exists(self.db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                           'path TEXT PRIMARY KEY, group_id TEXT, artifact_id TEXT, version TEXT, '
+                           'name TEXT, size INTEGER, mtime REAL, sha1 TEXT)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS files_coordinate '
+                           'ON files (group_id, artifact_id, version)')
+        self._conn.commit()
+        if is_new:
+            self.rebuild()
+
+    def exists(self, relative_path: str) -> bool:
+        return self.stat(relative_path) is not None
+
+    def stat(self, relative_path: str) -> tuple[int, float] | None:
+        """
+        :return: (size, mtime) | None
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT size, mtime FROM files WHERE path = ?',
+                                     (maven_store_path(relative_path),)).fetchone()
+        return row
+
+    def sha1(self, relative_path: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute('SELECT sha1 FROM files WHERE path = ?',
+                                     (maven_store_path(relative_path),)).fetchone()
+        return row[0] if row else None
+
+    def versions(self, group_id: str, artifact_id: str) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT version FROM files "
+                                      "WHERE group_id = ? AND artifact_id = ? AND version != ''",
+                                      (group_id, artifact_id)).fetchall()
+        return [row[0] for row in rows]
+
+    def files(self, group_id: str, artifact_id: str, version: str) -> list[tuple[str, int, str]]:
+        """
+        :return: [(name, size, sha1)]
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT name, size, sha1 FROM files '
+                                      'WHERE group_id = ? AND artifact_id = ? AND version = ? ORDER BY name',
+                                      (group_id, artifact_id, version)).fetchall()
+        return rows
+
+    def update(self, relative_path: str, sha1: str | None = None):
+        """
+        按磁盘当前状态更新单个文件, 文件不存在时删除记录
+        """
+        local_path = os.path.join(self.store_dir, relative_path)
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            self.remove(relative_path)
+            return
+        if sha1 is None:
+            sha1 = self._sidecar_sha1(local_path)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               self._row(relative_path, stat.st_size, stat.st_mtime, sha1))
+            self._conn.commit()
+
+    def remove(self, relative_path: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM files WHERE path = ?', (maven_store_path(relative_path),))
+            self._conn.commit()
+
+    def rebuild(self):
+        """
+        全量扫描store_dir重建索引
+        """
+        print(f'index: rebuild {self.store_dir}')
+        rows = []
+        for root, dirs, files in os.walk(self.store_dir):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                if name.startswith('.') or name.endswith(INDEX_SKIP_SUFFIXES):
+                    continue
+                local_path = os.path.join(root, name)
+                stat = os.stat(local_path)
+                sha1 = None if name.endswith(CHECKSUM_SUFFIXES) else self._sidecar_sha1(local_path)
+                relative_path = os.path.relpath(local_path, self.store_dir)
+                rows.append(self._row(relative_path, stat.st_size, stat.st_mtime, sha1))
+        with self._lock:
+            self._conn.execute('DELETE FROM files')
+            self._conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.commit()
+        print(f'index: {len(rows)} files')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row(relative_path: str, size: int, mtime: float, sha1: str | None) -> tuple:
+        path = maven_store_path(relative_path)
+        group_id, artifact_id, version = maven_path_coordinate(path)
+        return path, group_id, artifact_id, version, path.rpartition('/')[2], size, mtime, sha1 or ''
+
+    @staticmethod
+    def _sidecar_sha1(local_path: str) -> str:
+        if local_path.endswith(CHECKSUM_SUFFIXES):
+            return ''
+        try:
+            with open(local_path + '.sha1', 'r') as file:
+                values = file.read().split()
+        except OSError:
+            return ''
+        return values[0].lower() if values else ''
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+FILE_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha1(path: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(FILE_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class MavenGraphLock:
+    """
+    依赖图锁文件: 记录每个根节点解析出的依赖图及各节点pom(含parent)的摘要,
+    再次同步时pom/metadata未变化的节点直接复用依赖, 不再解析也不访问网络
+    :param store_dir: 本地存储根目录
+    :param lock_dir: 锁文件目录, 默认store_dir/.locks
+    """
+
+    def __init__(self, store_dir: str, lock_dir: str | None = None):
+        self.store_dir = store_dir
+        self.lock_dir = lock_dir or os.path.join(store_dir, '.locks')
+        self.nodes: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def lock_path(self, root: str) -> str:
+        group_id, artifact_id, version = root.split(':')
+        return os.path.join(self.lock_dir, group_id, artifact_id, (version or 'latest') + '.json')
+
+    def load(self, root: str):
+        lock_path = self.lock_path(root)
+        if not os.path.exists(lock_path):
+            return
+        try:
+            with open(lock_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'warning: load lock fail {lock_path}, {e}')
+            return
+        with self._lock:
+            for path, node in data.get('nodes', {}).items():
+                self.nodes.setdefault(path, node)
+
+    def save(self, root: str):
+        """
+        写入根节点可达的依赖图
+        """
+        with self._lock:
+            closure = {}
+            queue = [root]
+            while queue:
+                path = queue.pop()
+                if path in closure or path not in self.nodes:
+                    continue
+                closure[path] = self.nodes[path]
+                queue.extend(self.nodes[path]['deps'])
+        if not closure:
+            return
+        lock_path = self.lock_path(root)
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        temp_path = lock_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'root': root, 'nodes': closure}, file, indent=2, sort_keys=True)
+        os.replace(temp_path, lock_path)
+
+    def _file_entry(self, relative_path: str) -> list | None:
+        local_path = os.path.join(self.store_dir, relative_path)
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns, file_sha1(local_path)]
+
+    def _file_unchanged(self, relative_path: str, entry: list) -> bool:
+        """
+        大小和修改时间一致直接认为未变化, 否则按sha1比较,
+        内容一致时更新记录的修改时间
+        """
+        try:
+            stat = os.stat(os.path.join(self.store_dir, relative_path))
+        except OSError:
+            return False
+        size, mtime_ns, sha1 = entry
+        if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+            return True
+        if stat.st_size != size or file_sha1(os.path.join(self.store_dir, relative_path)) != sha1:
+            return False
+        entry[1] = stat.st_mtime_ns
+        return True
+
+    def replay(self, path: str, metadata_ttl: Callable[[str], float]) -> list[str] | None:
+        """
+        :param metadata_ttl: 返回metadata文件的有效期(秒), 按下载该文件的仓库源取值
+        :return: 节点未变化时返回记录的依赖, 否则None需要重新解析
+        """
+        with self._lock:
+            node = self.nodes.get(path)
+        if node is None:
+            return None
+        if node['artifact'] and not os.path.exists(os.path.join(self.store_dir, node['artifact'])):
+            return None
+        for relative_path, entry in node['files'].items():
+            if not self._file_unchanged(relative_path, entry):
+                return None
+        # 未指定版本的节点依赖metadata中的最新版本, metadata过期后需要重新解析
+        metadata_path = node.get('metadata')
+        if metadata_path:
+            local_metadata = os.path.join(self.store_dir, metadata_path)
+            if not os.path.exists(local_metadata) or \
+                    time.time() - os.path.getmtime(local_metadata) >= metadata_ttl(metadata_path):
+                return None
+        return node['deps']
+
+    def record(self, path: str, pom_paths: list[str], artifact_path: str, metadata_path: str,
+               deps: list[str]):
+        files = {}
+        for relative_path in pom_paths + ([metadata_path] if metadata_path else []):
+            entry = self._file_entry(relative_path)
+            if entry is None:
+                return
+            files[relative_path] = entry
+        node = {'files': files, 'artifact': artifact_path, 'metadata': metadata_path, 'deps': deps}
+        with self._lock:
+            self.nodes[path] = node
+
+
+class MavenSyncCheckpoint:
+    """
+    批量同步断点: 每完成一个节点追加一行(节点, 依赖),
+    中断后重新运行时已完成的节点直接复用依赖
+    :param checkpoint_path: 断点文件
+    :param key: 批量任务标识, 与文件中记录不一致时丢弃旧断点
+    """
+
+    def __init__(self, checkpoint_path: str, key: str):
+        self.checkpoint_path = checkpoint_path
+        self.key = key
+        self.nodes: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, 'r') as file:
+            lines = file.read().splitlines()
+        if not lines or lines[0] != self.key:
+            print(f'checkpoint: discard {self.checkpoint_path}')
+            return
+        for line in lines[1:]:
+            try:
+                path, deps = json.loads(line)
+            except ValueError:
+                # 中断时最后一行可能不完整
+                continue
+            self.nodes[path] = deps
+        print(f'checkpoint: resume {len(self.nodes)} nodes from {self.checkpoint_path}')
+
+    def get(self, path: str) -> list[str] | None:
+        with self._lock:
+            return self.nodes.get(path)
+
+    def done(self, path: str, deps: list[str]):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+                is_new = not self.nodes
+                self._file = open(self.checkpoint_path, 'w' if is_new else 'a')
+                if is_new:
+                    self._file.write(self.key + '\n')
+                else:
+                    # 上次中断时最后一行可能没有换行
+                    self._file.write('\n')
+            self.nodes[path] = deps
+            self._file.write(json.dumps([path, deps]) + '\n')
+            self._file.flush()
+
+    def finish(self):
+        """
+        全部完成后删除断点文件
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
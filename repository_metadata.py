@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from xml.dom import minidom
+from xml.parsers.expat import ExpatError
+
+from repository_file_checksum import gen_check_files
+from repository_route import METADATA_NAME
+from repository_version import maven_version_key
+
+
+def create_maven_metadata(group_id_v: str, artifact_id_v: str, versions_v: list[str]) -> bytes:
+    """
+    创建maven-metadata.xml
+    :param versions_v: 版本列表, 无需排序
+    """
+    versions_v = sorted(versions_v, key=maven_version_key)
+    releases = [version for version in versions_v if not version.endswith('-SNAPSHOT')]
+
+    doc = minidom.Document()
+    metadata = doc.createElement('metadata')
+    doc.appendChild(metadata)
+
+    def append_text(parent, name: str, value: str):
+        node = doc.createElement(name)
+        node.appendChild(doc.createTextNode(value))
+        parent.appendChild(node)
+
+    append_text(metadata, 'groupId', group_id_v)
+    append_text(metadata, 'artifactId', artifact_id_v)
+    versioning = doc.createElement('versioning')
+    metadata.appendChild(versioning)
+    if versions_v:
+        append_text(versioning, 'latest', versions_v[-1])
+    if releases:
+        append_text(versioning, 'release', releases[-1])
+    versions = doc.createElement('versions')
+    for version in versions_v:
+        append_text(versions, 'version', version)
+    versioning.appendChild(versions)
+    append_text(versioning, 'lastUpdated', time.strftime('%Y%m%d%H%M%S', time.gmtime()))
+
+    return doc.toprettyxml(indent='  ', newl='\n', encoding='UTF-8')
+
+
+class MavenMetadataBuilder:
+    """
+    按本地版本目录生成/更新groupId/artifactId/maven-metadata.xml及其校验文件
+    记录每个artifact目录及其版本目录的修改时间, 未变化的目录不再读取,
+    只重新生成有新增/删除版本的artifact;
+    已有metadata(如同步下载的远程metadata)中本地没有的版本会保留,
+    只去掉之前在本地存在但已删除的版本
+    :param store_dir: 仓库根目录
+    :param state_path: 状态文件, 默认store_dir/.metadata.json
+    """
+
+    def __init__(self, store_dir: str, state_path: str | None = None):
+        self.store_dir = store_dir
+        self.state_path = state_path or os.path.join(store_dir, '.metadata.json')
+        self.state: dict[str, dict] = {}
+        self.load()
+
+    def build(self, force: bool = False) -> dict:
+        """
+        扫描整个仓库, 更新有变化的artifact
+        :param force: 忽略状态全部重新生成
+        :return: 统计信息
+        """
+        start_time = time.time()
+        stats = {'artifacts': 0, 'updated': 0}
+        seen = set()
+        self._scan(self.store_dir, force, stats, seen)
+        for relative_dir in set(self.state.keys()) - seen:
+            del self.state[relative_dir]
+        self.save()
+        print(f'metadata: artifacts={stats["artifacts"]} updated={stats["updated"]} '
+              f'time={time.time() - start_time:.2f}s')
+        return stats
+
+    def update(self, group_id: str, artifact_id: str, force: bool = False) -> bool:
+        """
+        只更新单个artifact, 用于新增或重新打包版本后
+        :return: 是否重新生成
+        """
+        artifact_dir = os.path.join(self.store_dir, *group_id.split('.'), artifact_id)
+        updated = self._update(artifact_dir, self._versions(artifact_dir), force)
+        self.save()
+        return updated
+
+    def _scan(self, directory: str, force: bool, stats: dict, seen: set[str]):
+        relative_dir = os.path.relpath(directory, self.store_dir)
+        entry = self.state.get(relative_dir)
+        if entry and not force and self._unchanged(directory, entry):
+            seen.add(relative_dir)
+            stats['artifacts'] += 1
+            subdirs = [name for name in self._subdirs(directory) if name not in entry['versions'].keys()]
+        else:
+            # 至少有groupId/artifactId两级目录
+            versions = self._versions(directory) if os.sep in relative_dir else {}
+            if versions:
+                seen.add(relative_dir)
+                stats['artifacts'] += 1
+                if self._update(directory, versions, force):
+                    stats['updated'] += 1
+            subdirs = [name for name in self._subdirs(directory) if name not in versions.keys()]
+        # artifact目录下也可能有子groupId
+        for name in subdirs:
+            self._scan(os.path.join(directory, name), force, stats, seen)
+
+    def _update(self, artifact_dir: str, versions: dict[str, int], force: bool) -> bool:
+        relative_dir = os.path.relpath(artifact_dir, self.store_dir)
+        metadata_path = os.path.join(artifact_dir, METADATA_NAME)
+        entry = self.state.get(relative_dir)
+        if not versions:
+            self.state.pop(relative_dir, None)
+            return False
+        existing = self._metadata_versions(metadata_path)
+        # 保留已有metadata中的其他版本, 去掉上次在本地存在而现在已删除的版本
+        removed = entry['versions'].keys() - versions.keys() if entry else set()
+        kept = [version for version in existing if version not in removed]
+        merged = list(dict.fromkeys(list(versions.keys()) + kept))
+        if force or set(merged) != set(existing):
+            parts = relative_dir.split(os.sep)
+            content = create_maven_metadata('.'.join(parts[:-1]), parts[-1], merged)
+            temp_path = metadata_path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(content)
+            os.replace(temp_path, metadata_path)
+            gen_check_files(metadata_path)
+            print(f'metadata: {relative_dir} -> {len(merged)} versions')
+            updated = True
+        else:
+            updated = False
+        # 写入metadata会改变artifact目录的修改时间, 写入后再记录
+        self.state[relative_dir] = {'mtime': os.stat(artifact_dir).st_mtime_ns, 'versions': versions}
+        return updated
+
+    @staticmethod
+    def _unchanged(directory: str, entry: dict) -> bool:
+        try:
+            if os.stat(directory).st_mtime_ns != entry['mtime']:
+                return False
+            for version, mtime_ns in entry['versions'].items():
+                if os.stat(os.path.join(directory, version)).st_mtime_ns != mtime_ns:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def _metadata_versions(metadata_path: str) -> list[str]:
+        """
+        读取已有maven-metadata.xml中的版本列表, 文件不存在或无法解析时为空
+        """
+        try:
+            doc = minidom.parse(metadata_path)
+        except (OSError, ExpatError):
+            return []
+        versions = []
+        for node in doc.getElementsByTagName('versions'):
+            for child in node.getElementsByTagName('version'):
+                if child.firstChild and child.firstChild.data.strip():
+                    versions.append(child.firstChild.data.strip())
+        return versions
+
+    @staticmethod
+    def _subdirs(directory: str) -> list[str]:
+        try:
+            with os.scandir(directory) as entries:
+                return sorted(item.name for item in entries
+                              if item.is_dir() and not item.name.startswith('.'))
+        except OSError:
+            return []
+
+    def _versions(self, artifact_dir: str) -> dict[str, int]:
+        """
+        包含artifactId-version.*文件的子目录视为版本目录
+        :return: {version: 版本目录修改时间}
+        """
+        artifact_id = os.path.basename(artifact_dir)
+        versions = {}
+        for version in self._subdirs(artifact_dir):
+            version_dir = os.path.join(artifact_dir, version)
+            prefix = f'{artifact_id}-{version}'
+            with os.scandir(version_dir) as entries:
+                if any(item.is_file() and item.name.startswith(prefix) for item in entries):
+                    versions[version] = os.stat(version_dir).st_mtime_ns
+        return versions
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r') as file:
+                self.state = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'warning: load metadata state fail {self.state_path}, {e}')
+
+    def save(self):
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.state, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='generate maven-metadata.xml for a store tree')
+    parser.add_argument('store', help='store dir')
+    parser.add_argument('--state', default=None, help='state file, default <store>/.metadata.json')
+    parser.add_argument('--force', action='store_true', help='ignore state and regenerate all')
+    args = parser.parse_args()
+
+    MavenMetadataBuilder(args.store, args.state).build(args.force)
@@ -0,0 +1,443 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+import requests
+
+from repository_lock import file_sha1
+from repository_session import DEFAULT_TIMEOUT, MavenSessionPool, parse_retry_after
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# 收到429后的最多重试次数
+UPLOAD_THROTTLE_RETRIES = 5
+COMPONENTS_API = 'service/rest/v1/components'
+
+
+class MavenMultipartStream:
+    """
+    流式multipart/form-data请求体, 文件按块读取不整体载入内存,
+    预先计算长度以发送Content-Length
+    :param fields: [(name, value)], value为str表单值, 或(filename, local_path | bytes)文件
+    :param on_read: 每读出一块请求体时回调读取的字节数, 用于统计上传进度
+    """
+
+    def __init__(self, fields: list[tuple[str, str | tuple[str, str | bytes]]],
+                 on_read: Callable[[int], None] | None = None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.on_read = on_read
+        # 片段为bytes或文件路径
+        self._segments: list[bytes | str] = []
+        for name, value in fields:
+            if isinstance(value, tuple):
+                filename, source = value
+                self._segments.append(self._header(f'name="{name}"; filename="{filename}"',
+                                                   'Content-Type: application/octet-stream\r\n'))
+                self._segments.append(source)
+                self._segments.append(b'\r\n')
+            else:
+                self._segments.append(self._header(f'name="{name}"', '') + value.encode() + b'\r\n')
+        self._segments.append(f'--{self.boundary}--\r\n'.encode())
+        self._length = sum(len(segment) if isinstance(segment, bytes) else os.path.getsize(segment)
+                           for segment in self._segments)
+        self._index = 0
+        self._offset = 0
+        self._file = None
+        # 已读出的字节数, 失败重试时从进度中扣除
+        self.read_bytes = 0
+
+    def _header(self, disposition: str, extra: str) -> bytes:
+        return f'--{self.boundary}\r\nContent-Disposition: form-data; {disposition}\r\n{extra}\r\n'.encode()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        for chunk in iter(lambda: self.read(UPLOAD_CHUNK_SIZE), b''):
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length
+        result = bytearray()
+        while len(result) < size and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            if isinstance(segment, bytes):
+                chunk = segment[self._offset:self._offset + size - len(result)]
+                self._offset += len(chunk)
+            else:
+                if self._file is None:
+                    self._file = open(segment, 'rb')
+                chunk = self._file.read(size - len(result))
+            if chunk:
+                result += chunk
+                continue
+            self.close()
+            self._index += 1
+            self._offset = 0
+        self.read_bytes += len(result)
+        if result and self.on_read:
+            self.on_read(len(result))
+        return bytes(result)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class MavenComponent:
+    """
+    待发布的组件: 同一坐标下的artifact及pom
+    :param assets: [(source, extension, classifier)],
+                   source为本地文件路径或内存中的内容(如生成的pom)
+    """
+
+    def __init__(self, group_id: str, artifact_id: str, version: str,
+                 assets: list[tuple[str | bytes, str, str]]):
+        self.group_id = group_id
+        self.artifact_id = artifact_id
+        self.version = version
+        self.assets = assets
+
+    @property
+    def coordinate(self) -> str:
+        return f'{self.group_id}:{self.artifact_id}:{self.version}'
+
+    def asset_name(self, extension: str, classifier: str) -> str:
+        """
+        仓库中的文件名
+        """
+        classifier = '-' + classifier if classifier else ''
+        return f'{self.artifact_id}-{self.version}{classifier}.{extension}'
+
+    def asset_path(self, extension: str, classifier: str) -> str:
+        """
+        仓库中的相对地址
+        """
+        return '/'.join(self.group_id.split('.') + [self.artifact_id, self.version,
+                                                     self.asset_name(extension, classifier)])
+
+    def fields(self) -> list[tuple[str, str | tuple[str, str | bytes]]]:
+        """
+        Nexus components REST接口的maven2表单
+        """
+        fields = [
+            ('maven2.groupId', self.group_id),
+            ('maven2.artifactId', self.artifact_id),
+            ('maven2.version', self.version),
+        ]
+        for i, (source, extension, classifier) in enumerate(self.assets, 1):
+            fields.append((f'maven2.asset{i}', (self.asset_name(extension, classifier), source)))
+            fields.append((f'maven2.asset{i}.extension', extension))
+            if classifier:
+                fields.append((f'maven2.asset{i}.classifier', classifier))
+        return fields
+
+
+def scan_components(store_dir: str, extensions: tuple[str, ...] = ('aar',)) -> list[MavenComponent]:
+    """
+    扫描本地仓库目录(group/artifact/version/文件), 每个带同名pom的artifact作为一个组件
+    """
+    components = []
+    for root, dirs, files in os.walk(store_dir):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        paths = os.path.relpath(root, store_dir).split(os.sep)
+        if len(paths) < 3:
+            continue
+        version = paths[-1]
+        artifact_id = paths[-2]
+        group_id = '.'.join(paths[:-2])
+        prefix = f'{artifact_id}-{version}'
+        pom_name = prefix + '.pom'
+        if pom_name not in files:
+            continue
+        for name in sorted(files):
+            base, _, extension = name.rpartition('.')
+            if extension not in extensions or not base.startswith(prefix):
+                continue
+            classifier = base[len(prefix) + 1:] if base != prefix else ''
+            if classifier:
+                continue
+            assets = [(os.path.join(root, name), extension, ''), (os.path.join(root, pom_name), 'pom', '')]
+            sources_name = prefix + '-sources.jar'
+            if sources_name in files:
+                assets.append((os.path.join(root, sources_name), 'jar', 'sources'))
+            components.append(MavenComponent(group_id, artifact_id, version, assets))
+    return components
+
+
+class MavenPublishManifest:
+    """
+    本地发布清单: 记录每个仓库/坐标已发布文件的(size, mtime_ns, sha1)及发布时间,
+    再次发布时文件未变化直接跳过, 不访问网络;
+    大小和修改时间未变时复用记录的sha1不再读取文件
+    :param manifest_path: 清单文件
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.records: dict[str, dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def get(self, repository: str, coordinate: str) -> dict | None:
+        with self._lock:
+            return self.records.get(f'{repository}/{coordinate}')
+
+    def put(self, repository: str, coordinate: str, assets: dict[str, list]):
+        record = {'assets': assets, 'published_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with self._lock:
+            self.records[f'{repository}/{coordinate}'] = record
+            self._dirty = True
+
+    def load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'warning: load publish manifest fail {self.manifest_path}, {e}')
+            return
+        with self._lock:
+            self.records = data
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = dict(self.records)
+            self._dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+
+class MavenPublisher:
+    """
+    并发发布组件到Nexus(POST service/rest/v1/components), 复用keep-alive连接, 请求体流式发送
+    :param uri: Nexus地址, 如https://maven.cherrysoft.cn/
+    :param repository: 目标仓库名
+    :param username: 用户名
+    :param password: 密码
+    :param max_workers: 同时上传的组件数
+    :param retries: 连接失败, 超时及5xx时的重试次数, 每次重试重新打开文件;
+                    429按Retry-After等待后重试
+    :param manifest_path: 发布清单, 为空时只按远程sha1判断是否需要上传,
+                          见MavenPublishManifest
+    """
+
+    def __init__(self, uri: str, repository: str, username: str | None = None, password: str | None = None,
+                 max_workers: int = 4, timeout: tuple[float, float] = DEFAULT_TIMEOUT, retries: int = 2,
+                 manifest_path: str | None = None):
+        self.host = {'uri': uri if uri.endswith('/') else uri + '/'}
+        if username and password:
+            self.host['credentials'] = {'username': username, 'password': password}
+        self.repository = repository
+        self.url = f'{self.host["uri"]}{COMPONENTS_API}?repository={repository}'
+        self.manifest = MavenPublishManifest(manifest_path) if manifest_path else None
+        self.max_workers = max_workers
+        self.retries = retries
+        # 重试(包括429)在上传时处理, 已发送的请求体无法在会话层重放
+        self.sessions = MavenSessionPool(pool_size=max_workers, timeout=timeout, retries=0,
+                                         throttle_retries=0)
+        self.uploaded_components = 0
+        self.skipped_components = 0
+        self.failed_components = 0
+        self.sent_bytes = 0
+        self.total_bytes = 0
+        self._start_time = 0.0
+        self._lock = threading.Lock()
+
+    def upload(self, component: MavenComponent) -> bool:
+        attempt = 0
+        throttled = 0
+        while attempt <= self.retries:
+            # 每次请求重新构造请求体
+            stream = MavenMultipartStream(component.fields(), self._on_read)
+            try:
+                with stream:
+                    response = self.sessions.request(self.host, 'POST', self.url, data=stream,
+                                                     headers={'Content-Type': stream.content_type})
+            except requests.RequestException as e:
+                print(f'upload: {component.coordinate} -> {e!r}')
+                self._on_read(-stream.read_bytes)
+                attempt += 1
+                continue
+            if response.status_code < 300:
+                print(f'upload: {component.coordinate} -> {response.status_code}')
+                return True
+            self._on_read(-stream.read_bytes)
+            if response.status_code == 429 and throttled < UPLOAD_THROTTLE_RETRIES:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'),
+                                                self.sessions.backoff * (2 ** throttled))
+                print(f'upload: {component.coordinate} -> 429, retry after {retry_after:.1f}s')
+                # 暂停该仓库源的所有上传, 下次请求前由限速器等待
+                self.sessions.limiter(self.host).throttle(retry_after)
+                throttled += 1
+                continue
+            print(f'upload: {component.coordinate} -> {response.status_code}, {response.text}')
+            if response.status_code < 500:
+                return False
+            attempt += 1
+        return False
+
+    def publish(self, component: MavenComponent) -> bool | None:
+        """
+        增量发布: 本地sha1与发布清单或远程.sha1一致时跳过
+        :return: True已上传, None未变化跳过, False失败
+        """
+        assets = self.local_assets(component)
+        if self.manifest:
+            record = self.manifest.get(self.repository, component.coordinate)
+            if record and self._same_sha1(record['assets'], assets):
+                print(f'upload: {component.coordinate} -> unchanged')
+                return None
+        if self.remote_unchanged(component, assets):
+            print(f'upload: {component.coordinate} -> unchanged remote')
+            result = None
+        elif self.upload(component):
+            result = True
+        else:
+            return False
+        if self.manifest:
+            self.manifest.put(self.repository, component.coordinate, assets)
+        return result
+
+    def local_assets(self, component: MavenComponent) -> dict[str, list]:
+        """
+        每个文件只读取一次计算sha1, 大小和修改时间与清单一致时直接复用
+        :return: {仓库中的相对地址: [size, mtime_ns, sha1]}
+        """
+        record = self.manifest.get(self.repository, component.coordinate) if self.manifest else None
+        recorded = record['assets'] if record else {}
+        assets = {}
+        for source, extension, classifier in component.assets:
+            asset_path = component.asset_path(extension, classifier)
+            if isinstance(source, bytes):
+                assets[asset_path] = [len(source), 0, hashlib.sha1(source).hexdigest()]
+                continue
+            stat = os.stat(source)
+            entry = recorded.get(asset_path)
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                assets[asset_path] = entry
+            else:
+                assets[asset_path] = [stat.st_size, stat.st_mtime_ns, file_sha1(source)]
+        return assets
+
+    def remote_unchanged(self, component: MavenComponent, assets: dict[str, list]) -> bool:
+        """
+        逐个比较仓库中的.sha1, 有任一文件缺失或不一致即需要上传
+        """
+        for asset_path, (_, _, sha1) in assets.items():
+            url = f'{self.host["uri"]}repository/{self.repository}/{asset_path}.sha1'
+            try:
+                response = self.sessions.request(self.host, 'GET', url)
+            except requests.RequestException:
+                return False
+            values = response.text.split() if response.status_code == 200 else []
+            if not values or values[0].lower() != sha1:
+                return False
+        return True
+
+    @staticmethod
+    def _same_sha1(recorded: dict[str, list], assets: dict[str, list]) -> bool:
+        return recorded.keys() == assets.keys() and \
+            all(recorded[key][2] == assets[key][2] for key in assets.keys())
+
+    def uploads(self, components: list[MavenComponent], incremental: bool = False) -> dict:
+        """
+        并发上传, 每完成一个组件打印进度
+        :param incremental: 是否跳过未变化的组件, 见publish
+        :return: 统计信息
+        """
+        self._start_time = time.time()
+        # 按请求体长度统计, 包含multipart分隔
+        self.total_bytes = sum(len(MavenMultipartStream(component.fields())) for component in components)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            function = self.publish if incremental else self.upload
+            futures = {executor.submit(function, component): component for component in components}
+            for future in as_completed(futures):
+                result = future.result()
+                with self._lock:
+                    if result:
+                        self.uploaded_components += 1
+                    elif result is None:
+                        self.skipped_components += 1
+                    else:
+                        self.failed_components += 1
+                self.print_progress(len(components))
+        if self.manifest:
+            self.manifest.save()
+        elapsed = max(time.time() - self._start_time, 1e-6)
+        stats = {
+            'components': len(components),
+            'uploaded': self.uploaded_components,
+            'skipped': self.skipped_components,
+            'failed': self.failed_components,
+            'bytes': self.sent_bytes,
+            'seconds': elapsed,
+        }
+        print(f'publish: components={stats["components"]} uploaded={stats["uploaded"]} '
+              f'skipped={stats["skipped"]} failed={stats["failed"]} '
+              f'bytes={stats["bytes"]} time={elapsed:.2f}s {stats["bytes"] / elapsed / 1024 / 1024:.2f} MB/s')
+        return stats
+
+    def _on_read(self, size: int):
+        with self._lock:
+            self.sent_bytes += size
+
+    def print_progress(self, num_components: int):
+        with self._lock:
+            done = self.uploaded_components + self.skipped_components + self.failed_components
+            sent_bytes = self.sent_bytes
+        elapsed = max(time.time() - self._start_time, 1e-6)
+        print(f'publish: {done}/{num_components} components, '
+              f'{sent_bytes / 1024 / 1024:.2f}/{self.total_bytes / 1024 / 1024:.2f} MB, '
+              f'{sent_bytes / elapsed / 1024 / 1024:.2f} MB/s')
+
+    def close(self):
+        if self.manifest:
+            self.manifest.save()
+        self.sessions.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='publish components from a local store to nexus')
+    parser.add_argument('store', help='local store dir, group/artifact/version/files')
+    parser.add_argument('--uri', required=True, help='nexus base uri')
+    parser.add_argument('--repository', required=True, help='target repository name')
+    parser.add_argument('--username', default=os.environ.get('MAVEN_USERNAME'))
+    parser.add_argument('--password', default=os.environ.get('MAVEN_PASSWORD'))
+    parser.add_argument('--extensions', nargs='+', default=['aar'], help='artifact extensions to publish')
+    parser.add_argument('--workers', type=int, default=4, help='max uploads at the same time')
+    parser.add_argument('--incremental', action='store_true', help='skip components already published')
+    parser.add_argument('--manifest', default=None, help='publish manifest, default <store>/.publish.json')
+    args = parser.parse_args()
+
+    publisher = MavenPublisher(args.uri, args.repository, args.username, args.password,
+                               max_workers=args.workers,
+                               manifest_path=args.manifest or os.path.join(args.store, '.publish.json'))
+    try:
+        publisher.uploads(scan_components(args.store, tuple(args.extensions)), args.incremental)
+        publisher.sessions.print_stats()
+    finally:
+        publisher.close()
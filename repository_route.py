@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+
+METADATA_NAME = 'maven-metadata.xml'
+
+
+def maven_path_group_id(relative_path: str) -> str:
+    """
+    从仓库文件相对地址推导groupId
+    group/artifact/maven-metadata.xml 或 group/artifact/version/file
+    """
+    parts = [part for part in relative_path.replace('\\', '/').split('/') if part]
+    if len(parts) > 0 and parts[-1].startswith(METADATA_NAME):
+        group_parts = parts[:-2]
+    else:
+        group_parts = parts[:-3]
+    return '.'.join(group_parts)
+
+
+class MavenHostRouter:
+    """
+    仓库源路由表: 记录groupId由哪个仓库源提供, 以及(仓库源, 文件)未命中的负缓存
+    :param store_path: 持久化文件, 为空时只在内存中生效
+    :param miss_ttl: 负缓存有效期(秒)
+    """
+
+    def __init__(self, store_path: str | None = None, miss_ttl: float = 24 * 60 * 60):
+        self.store_path = store_path
+        self.miss_ttl = miss_ttl
+        self.routes: dict[str, str] = {}
+        self.misses: dict[str, float] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def _miss_key(host: dict, relative_path: str) -> str:
+        return host['uri'] + '\t' + relative_path
+
+    def route(self, relative_path: str) -> str | None:
+        """
+        查找提供该groupId(或其前缀)的仓库源
+        """
+        prefix = maven_path_group_id(relative_path)
+        with self._lock:
+            while prefix:
+                if prefix in self.routes:
+                    return self.routes[prefix]
+                prefix = prefix.rpartition('.')[0]
+        return None
+
+    def order(self, hosts: list, relative_path: str) -> list:
+        """
+        按路由排序仓库源: 已知提供该groupId(或其前缀)的仓库源优先,
+        负缓存未过期的仓库源跳过
+        """
+        route_uri = self.route(relative_path)
+        now = time.time()
+        with self._lock:
+            result = []
+            for host in hosts:
+                expire = self.misses.get(self._miss_key(host, relative_path))
+                if expire is not None and expire > now:
+                    continue
+                if host['uri'] == route_uri:
+                    result.insert(0, host)
+                else:
+                    result.append(host)
+        return result
+
+    def hit(self, host: dict, relative_path: str):
+        group_id = maven_path_group_id(relative_path)
+        with self._lock:
+            self.misses.pop(self._miss_key(host, relative_path), None)
+            if group_id and self.routes.get(group_id) != host['uri']:
+                self.routes[group_id] = host['uri']
+                self._dirty = True
+
+    def miss(self, host: dict, relative_path: str):
+        with self._lock:
+            self.misses[self._miss_key(host, relative_path)] = time.time() + self.miss_ttl
+            self._dirty = True
+
+    def load(self):
+        if not self.store_path or not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'warning: load routes fail {self.store_path}, {e}')
+            return
+        now = time.time()
+        with self._lock:
+            self.routes = data.get('routes', {})
+            self.misses = {key: expire for key, expire in data.get('misses', {}).items() if expire > now}
+
+    def save(self):
+        if not self.store_path:
+            return
+        now = time.time()
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                'routes': dict(self.routes),
+                'misses': {key: expire for key, expire in self.misses.items() if expire > now},
+            }
+            self._dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+        temp_path = self.store_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.store_path)
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+# 连接/读取超时(秒)
+DEFAULT_TIMEOUT = (10.0, 60.0)
+# 可重试的服务端错误
+TRANSIENT_STATUS = (500, 502, 503, 504)
+
+
+def maven_host_auth(host: dict) -> HTTPBasicAuth | None:
+    """
+    解析maven仓库源的认证信息
+    :param host: maven仓库源信息
+    :return: HTTPBasicAuth | None
+    """
+    if 'credentials' in host.keys():
+        credentials = host['credentials']
+        credentials_keys = credentials.keys()
+        if 'username' in credentials_keys and 'password' in credentials_keys:
+            username = credentials['username']
+            password = credentials['password']
+            if username and password:
+                return HTTPBasicAuth(username, password)
+    return None
+
+
+class MavenCircuitOpenError(requests.ConnectionError):
+    """
+    仓库源连续失败, 熔断冷却中
+    """
+
+
+class MavenHostHealth:
+    """
+    仓库源健康状态: 连续失败达到阈值后熔断, 冷却期内跳过该仓库源;
+    记录响应耗时, 快的仓库源排在前面
+    :param failure_threshold: 熔断前允许的连续失败次数
+    :param cooldown: 熔断冷却时间(秒), 之后放行一次请求试探
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures: dict[str, int] = {}
+        self._open_until: dict[str, float] = {}
+        self._latency: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def available(self, host: dict) -> bool:
+        with self._lock:
+            return self._open_until.get(host['uri'], 0) <= time.time()
+
+    def success(self, host: dict, latency: float):
+        uri = host['uri']
+        with self._lock:
+            self._failures.pop(uri, None)
+            self._open_until.pop(uri, None)
+            last = self._latency.get(uri)
+            self._latency[uri] = latency if last is None else last * 0.8 + latency * 0.2
+
+    def failure(self, host: dict):
+        uri = host['uri']
+        with self._lock:
+            failures = self._failures.get(uri, 0) + 1
+            self._failures[uri] = failures
+            if failures >= self.failure_threshold:
+                self._open_until[uri] = time.time() + self.cooldown
+                print(f'circuit: open {uri} for {self.cooldown}s after {failures} failures')
+
+    def order(self, hosts: list) -> list:
+        """
+        去掉熔断中的仓库源, 有耗时记录的按耗时排前, 其余保持原顺序
+        """
+        now = time.time()
+        with self._lock:
+            available = [host for host in hosts if self._open_until.get(host['uri'], 0) <= now]
+            latency = dict(self._latency)
+        return sorted(available, key=lambda host: latency.get(host['uri'], float('inf')))
+
+
+def parse_retry_after(value: str | None, default: float) -> float:
+    """
+    解析Retry-After, 支持秒数和HTTP日期
+    """
+    if not value:
+        return default
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class MavenHostLimiter:
+    """
+    单个仓库源的并发数和速率限制, 在hosts中配置:
+    'max_concurrency': 同时进行的请求数, 'rate_limit': 每秒请求数(令牌桶),
+    'rate_burst': 令牌桶容量
+    收到429时按Retry-After暂停该仓库源并降低速率, 之后随成功请求逐步恢复
+    """
+
+    def __init__(self, max_concurrency: int = 0, rate_limit: float = 0, rate_burst: float | None = None):
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self.max_rate = rate_limit
+        self.rate = rate_limit
+        self.burst = rate_burst or max(rate_limit, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of(cls, host: dict) -> MavenHostLimiter:
+        return cls(host.get('max_concurrency', 0), host.get('rate_limit', 0), host.get('rate_burst'))
+
+    @contextmanager
+    def slot(self):
+        """
+        占用一个并发名额, 应覆盖请求及响应体读取
+        """
+        if self._semaphore:
+            self._semaphore.acquire()
+        try:
+            yield
+        finally:
+            if self._semaphore:
+                self._semaphore.release()
+
+    def take(self):
+        """
+        获取一个令牌, 仓库源被429暂停时等待到Retry-After之后
+        """
+        wait_time = self.reserve()
+        while wait_time > 0:
+            time.sleep(wait_time)
+            wait_time = self.reserve()
+
+    def reserve(self) -> float:
+        """
+        尝试获取一个令牌, 不阻塞
+        :return: 0表示已获取, 否则为需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._blocked_until - now
+            if wait_time > 0:
+                return wait_time
+            if self.rate <= 0:
+                return 0
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def throttle(self, retry_after: float):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            if self.max_rate > 0:
+                self.rate = max(self.max_rate / 8, self.rate / 2)
+
+    def recover(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class MavenSessionPool:
+    """
+    按maven仓库源复用的keep-alive session, 避免每个文件重新建立TCP/TLS连接
+    :param pool_size: 每个仓库源的连接池大小, 并发同步时不应小于线程数
+    :param keep_alive: 是否保持长连接
+    :param timeout: (连接超时, 读取超时)秒
+    :param retries: 连接失败, 超时及5xx时的重试次数, 退避时间指数增长并随机抖动
+    :param backoff: 首次重试的最大退避时间(秒)
+    :param throttle_retries: 收到429后的最多重试次数
+    """
+
+    def __init__(self, pool_size: int = 16, keep_alive: bool = True,
+                 timeout: tuple[float, float] = DEFAULT_TIMEOUT, retries: int = 2, backoff: float = 0.5,
+                 health: MavenHostHealth | None = None, throttle_retries: int = 5):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.throttle_retries = throttle_retries
+        self.health = health or MavenHostHealth()
+        self._sessions: dict[str, requests.Session] = {}
+        self._limiters: dict[str, MavenHostLimiter] = {}
+        self._lock = threading.Lock()
+        urllib3.disable_warnings()
+
+    def limiter(self, host: dict) -> MavenHostLimiter:
+        uri = host['uri']
+        with self._lock:
+            limiter = self._limiters.get(uri)
+            if limiter is None:
+                limiter = self._limiters[uri] = MavenHostLimiter.of(host)
+            return limiter
+
+    def slot(self, host: dict):
+        """
+        占用仓库源的一个并发名额, 用法: with sessions.slot(host): ...
+        """
+        return self.limiter(host).slot()
+
+    def request(self, host: dict, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        带超时, 限速, 重试和熔断的请求
+        """
+        if not self.health.available(host):
+            raise MavenCircuitOpenError(f'circuit open: {host["uri"]}')
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.session(host)
+        limiter = self.limiter(host)
+        attempt = 0
+        throttled = 0
+        while True:
+            limiter.take()
+            start_time = time.time()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self.settle(host, None, attempt, start_time)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code == 429:
+                    retry_after = self.throttle(host, response.headers.get('Retry-After'), throttled)
+                    if retry_after is None:
+                        # 重试次数用尽, 429不能当作成功提升速率或记录耗时
+                        return response
+                    # 等待由limiter.take完成
+                    response.close()
+                    throttled += 1
+                    continue
+                delay = self.settle(host, response.status_code, attempt, start_time)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def throttle(self, host: dict, retry_after: str | None, throttled: int) -> float | None:
+        """
+        收到429后按Retry-After暂停仓库源并降低速率, 线程池和asyncio引擎共用
+        :param throttled: 该请求已因429重试的次数
+        :return: 暂停秒数, 超过throttle_retries时返回None, 不再重试
+        """
+        if throttled >= self.throttle_retries:
+            return None
+        delay = parse_retry_after(retry_after, self.backoff * (2 ** throttled))
+        print(f'throttle: {host["uri"]} retry after {delay:.1f}s')
+        self.limiter(host).throttle(delay)
+        return delay
+
+    def settle(self, host: dict, status: int | None, attempt: int, start_time: float) -> float | None:
+        """
+        记录一次请求的结果, 更新熔断状态和速率, 线程池和asyncio引擎共用
+        :param status: 响应状态码, 连接失败或超时时为None; 429由throttle处理, 不应传入
+        :param attempt: 已重试的次数
+        :return: 需要重试时返回退避时间(full jitter), 否则返回None
+        """
+        if status is not None and status not in TRANSIENT_STATUS:
+            self.limiter(host).recover()
+            self.health.success(host, time.time() - start_time)
+            return None
+        if attempt >= self.retries:
+            self.health.failure(host)
+            return None
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def session(self, host: dict) -> requests.Session:
+        uri = host['uri']
+        with self._lock:
+            session = self._sessions.get(uri)
+            if session is None:
+                session = self._create_session(host)
+                self._sessions[uri] = session
+            return session
+
+    def _create_session(self, host: dict) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.auth = maven_host_auth(host)
+        session.verify = False
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def stats(self) -> dict[str, dict]:
+        """
+        连接复用统计
+        :return: {uri: {'requests': 请求数, 'connections': 新建连接数, 'reused': 复用次数}}
+        """
+        result = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for uri, session in sessions:
+            num_requests = 0
+            num_connections = 0
+            pools = session.get_adapter(uri).poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+            result[uri] = {
+                'requests': num_requests,
+                'connections': num_connections,
+                'reused': max(num_requests - num_connections, 0),
+            }
+        return result
+
+    def print_stats(self):
+        for uri, item in self.stats().items():
+            print(f'session: {uri} requests={item["requests"]} connections={item["connections"]} '
+                  f'reused={item["reused"]}')
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from repository_index import maven_store_path
+
+SYMBOL_EXTENSIONS = ('.jar', '.aar')
+SYMBOL_SKIP_SUFFIXES = ('-sources.jar', '-javadoc.jar')
+
+
+def _jar_classes(zip_ref: zipfile.ZipFile) -> list[str]:
+    classes = []
+    for name in zip_ref.namelist():
+        if not name.endswith('.class') or name.startswith('META-INF/') or name.endswith('module-info.class'):
+            continue
+        classes.append(name[:-len('.class')].replace('/', '.'))
+    return classes
+
+
+def archive_classes(path: str) -> list[str] | None:
+    """
+    提取压缩包中的类名(com.foo.Bar, 内部类com.foo.Bar$Inner),
+    aar读取内部的classes.jar和libs/*.jar
+    :return: 类名列表, 不是有效zip时返回None
+    """
+    try:
+        with zipfile.ZipFile(path, 'r') as zip_ref:
+            if not path.endswith('.aar'):
+                return _jar_classes(zip_ref)
+            classes = []
+            for name in zip_ref.namelist():
+                if name == 'classes.jar' or (name.startswith('libs/') and name.endswith('.jar')):
+                    with zipfile.ZipFile(io.BytesIO(zip_ref.read(name)), 'r') as inner_ref:
+                        classes.extend(_jar_classes(inner_ref))
+            return classes
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f'warning: read archive fail {path}, {e}')
+        return None
+
+
+def is_symbol_archive(relative_path: str) -> bool:
+    return relative_path.endswith(SYMBOL_EXTENSIONS) and not relative_path.endswith(SYMBOL_SKIP_SUFFIXES)
+
+
+class MavenSymbolIndex:
+    """
+    类名到artifact的倒排索引(SQLite), 按类名/包名前缀查询哪些artifact提供了该类,
+    如查找同一SDK的多个副本; 首次创建时全量扫描, 之后随下载增量更新,
+    未变化(大小和修改时间一致)的压缩包不再读取
+    :param store_dir: 本地存储根目录
+    :param db_path: 索引文件, 默认store_dir/.symbols.db
+    :param max_workers: 全量扫描时读取压缩包的进程数, 默认cpu核数
+    """
+
+    def __init__(self, store_dir: str, db_path: str | None = None, max_workers: int | None = None):
+        self.store_dir = store_dir
+        self.db_path = db_path or os.path.join(store_dir, '.symbols.db')
+        self.max_workers = max_workers
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        is_new = not os.path.exists(self.db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS archives '
+                           '(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS symbols (name TEXT, path TEXT)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path)')
+        self._conn.commit()
+        if is_new:
+            self.rebuild()
+
+    def find(self, prefix: str, limit: int = 1000) -> list[tuple[str, str]]:
+        """
+        按前缀查询类, 如com.google.gson.Gson或包名com.google.gson.
+        :return: [(类名, 压缩包相对地址)]
+        """
+        with self._lock:
+            return self._conn.execute('SELECT name, path FROM symbols WHERE name >= ? AND name < ? '
+                                      'ORDER BY name, path LIMIT ?',
+                                      (prefix, prefix + '\uffff', limit)).fetchall()
+
+    def providers(self, prefix: str) -> list[tuple[str, int]]:
+        """
+        提供前缀下类的压缩包, 多于一个时通常是重复引入的SDK
+        :return: [(压缩包相对地址, 类数量)]
+        """
+        with self._lock:
+            return self._conn.execute('SELECT path, COUNT(*) FROM symbols WHERE name >= ? AND name < ? '
+                                      'GROUP BY path ORDER BY path', (prefix, prefix + '\uffff')).fetchall()
+
+    def update(self, relative_path: str) -> bool:
+        """
+        按磁盘当前状态更新单个压缩包, 文件不存在时删除记录
+        :return: 是否重新读取
+        """
+        if not is_symbol_archive(relative_path):
+            return False
+        local_path = os.path.join(self.store_dir, relative_path)
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            self.remove(relative_path)
+            return False
+        path = maven_store_path(relative_path)
+        with self._lock:
+            row = self._conn.execute('SELECT size, mtime FROM archives WHERE path = ?', (path,)).fetchone()
+        if row == (stat.st_size, stat.st_mtime_ns):
+            return False
+        self._put(path, stat.st_size, stat.st_mtime_ns, archive_classes(local_path))
+        return True
+
+    def remove(self, relative_path: str):
+        path = maven_store_path(relative_path)
+        with self._lock:
+            self._conn.execute('DELETE FROM symbols WHERE path = ?', (path,))
+            self._conn.execute('DELETE FROM archives WHERE path = ?', (path,))
+            self._conn.commit()
+
+    def rebuild(self):
+        """
+        扫描store_dir, 读取新增或变化的压缩包, 删除已不存在的记录
+        """
+        start_time = time.time()
+        with self._lock:
+            indexed = dict((path, (size, mtime)) for path, size, mtime in
+                           self._conn.execute('SELECT path, size, mtime FROM archives'))
+        pending = []
+        for root, dirs, files in os.walk(self.store_dir):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                local_path = os.path.join(root, name)
+                path = maven_store_path(os.path.relpath(local_path, self.store_dir))
+                if not is_symbol_archive(path):
+                    continue
+                stat = os.stat(local_path)
+                if indexed.pop(path, None) != (stat.st_size, stat.st_mtime_ns):
+                    pending.append((path, local_path, stat.st_size, stat.st_mtime_ns))
+        for path in indexed.keys():
+            self.remove(path)
+        if pending:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                listings = executor.map(archive_classes, [local_path for _, local_path, _, _ in pending],
+                                        chunksize=16)
+                for (path, _, size, mtime), classes in zip(pending, listings):
+                    self._put(path, size, mtime, classes)
+        print(f'symbol: indexed {len(pending)} archives, removed {len(indexed)}, '
+              f'time={time.time() - start_time:.2f}s')
+
+    def _put(self, path: str, size: int, mtime: int, classes: list[str] | None):
+        # 无效的压缩包也记录, 文件未变化时不再重复读取
+        with self._lock:
+            self._conn.execute('DELETE FROM symbols WHERE path = ?', (path,))
+            self._conn.executemany('INSERT INTO symbols VALUES (?, ?)',
+                                   [(name, path) for name in classes or []])
+            self._conn.execute('INSERT OR REPLACE INTO archives VALUES (?, ?, ?)', (path, size, mtime))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='find artifacts providing a class or package')
+    parser.add_argument('prefix',
+                        help='class or package prefix, e.g. okhttp3.OkHttpClient or com.google.gson.')
+    parser.add_argument('--store', default='.m', help='local store dir')
+    parser.add_argument('--providers', action='store_true', help='list archives and class counts only')
+    parser.add_argument('--rebuild', action='store_true', help='rescan store before query')
+    parser.add_argument('--limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    index = MavenSymbolIndex(args.store)
+    try:
+        if args.rebuild:
+            index.rebuild()
+        if args.providers:
+            for archive_path, count in index.providers(args.prefix):
+                print(f'{archive_path}: {count}')
+        else:
+            for class_name, archive_path in index.find(args.prefix, args.limit):
+                print(f'{class_name}: {archive_path}')
+    finally:
+        index.close()
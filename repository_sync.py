@@ -1,91 +1,740 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import os
 import re
+import sys
+import threading
 import time
 import xml.etree.ElementTree as etree
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import TextIO
 
 import requests
-from requests import Response
-from requests.auth import HTTPBasicAuth
 
+from repository_index import MavenStoreIndex
+from repository_lock import MavenGraphLock, MavenSyncCheckpoint
+from repository_route import MavenHostRouter
+from repository_session import DEFAULT_TIMEOUT, MavenHostHealth, MavenSessionPool, maven_host_auth
+from repository_symbol import MavenSymbolIndex
+from repository_validator import MavenValidatorStore
+from repository_version import (MavenVersionResolver, maven_is_range, maven_normalize_version,
+                                maven_select_version)
 
-def maven_download_file(host: dict, store_dir: str, relative_path: str) -> Response | None:
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+FINGERPRINT_NAMES = ['md5', 'sha1', 'sha256', 'sha512']
+# 确认仓库源不存在文件的状态码, 只有这些状态写入未命中负缓存
+NOT_FOUND_STATUS = (404, 410)
+
+
+class MavenDownload:
+    """
+    下载结果, 文件已落盘, 摘要在下载过程中同步计算
+    """
+
+    def __init__(self, host: dict, relative_path: str, local_path: str, size: int, digests: dict[str, str],
+                 etag: str | None = None, last_modified: str | None = None, not_modified: bool = False):
+        self.host = host
+        self.relative_path = relative_path
+        self.local_path = local_path
+        self.size = size
+        self.digests = digests
+        self.etag = etag
+        self.last_modified = last_modified
+        # 条件请求返回304, 本地文件仍有效
+        self.not_modified = not_modified
+
+    @property
+    def text(self) -> str:
+        with open(self.local_path, 'r') as file:
+            return file.read()
+
+
+class MavenDownloadFailure:
+    """
+    下载失败, 布尔值为False, 可以和None一样判断; status为最后一次响应的状态码,
+    连接失败, 超时, 熔断或传输中断时为None
+    """
+
+    def __init__(self, status: int | None = None):
+        self.status = status
+
+    def __bool__(self) -> bool:
+        return False
+
+    @property
+    def not_found(self) -> bool:
+        """
+        仓库源确认不存在该文件(404/410), 其余失败可能是暂时的
+        """
+        return self.status in NOT_FOUND_STATUS
+
+
+# {本地文件: [锁, 使用中的线程数]}, 没有线程使用时删除
+_download_locks: dict[str, list] = {}
+_download_locks_lock = threading.Lock()
+
+
+@contextmanager
+def _download_lock(local_path: str):
+    """
+    同一个本地文件同时只允许一个线程下载, 避免共用.part文件
+    """
+    with _download_locks_lock:
+        entry = _download_locks.get(local_path)
+        if entry is None:
+            entry = _download_locks[local_path] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _download_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _download_locks[local_path]
+
+
+def maven_part_validator(part_path: str, url: str) -> dict | None:
+    """
+    读取.part文件对应的验证信息, 只有同一url且有ETag/Last-Modified时才可以断点续传
+    """
+    if not os.path.exists(part_path) or not os.path.exists(part_path + '.json'):
+        return None
+    try:
+        with open(part_path + '.json', 'r') as file:
+            validator = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if validator.get('url') != url or not (validator.get('etag') or validator.get('last_modified')):
+        return None
+    return validator
+
+
+def maven_remove_part(part_path: str):
+    for path in (part_path, part_path + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class MavenPartFile:
+    """
+    下载中的.part文件, 与http库无关, 线程池和asyncio引擎共用:
+    决定是否Range续传, 分块写入并计算摘要, 完成后校验大小并原子重命名
+    :param can_resume: 为False时忽略已有的.part文件
+    """
+
+    def __init__(self, host: dict, relative_path: str, url: str, local_path: str, can_resume: bool = True):
+        self.host = host
+        self.relative_path = relative_path
+        self.url = url
+        self.local_path = local_path
+        self.part_path = local_path + '.part'
+        self._validator = maven_part_validator(self.part_path, url) if can_resume else None
+        self.offset = os.path.getsize(self.part_path) if self._validator else 0
+        self.size = 0
+        self.etag = None
+        self.last_modified = None
+        self._expected_size = ''
+        self._hashes = {}
+        self._file = None
+
+    def request_headers(self, headers: dict[str, str] | None) -> dict[str, str]:
+        request_headers = dict(headers) if headers else {}
+        if self.offset > 0:
+            request_headers['Range'] = f'bytes={self.offset}-'
+            request_headers['If-Range'] = self._validator['etag'] or self._validator['last_modified']
+        return request_headers
+
+    def not_modified(self, status: int, headers) -> MavenDownload | None:
+        """
+        条件请求返回304且本地文件存在时, 返回not_modified的结果
+        """
+        if status != 304 or not os.path.exists(self.local_path):
+            return None
+        return MavenDownload(self.host, self.relative_path, self.local_path, os.path.getsize(self.local_path),
+                             {}, headers.get('ETag'), headers.get('Last-Modified'), not_modified=True)
+
+    def restart(self, status: int) -> bool:
+        """
+        416表示.part与远程文件不一致, 丢弃后需要完整重新下载
+        """
+        if status == 416 and self.offset > 0:
+            maven_remove_part(self.part_path)
+            return True
+        return False
+
+    def open(self, status: int, headers) -> bool:
+        """
+        按响应准备写入: 206且Content-Range与.part大小一致时续传, 200时重新写入
+        :return: 响应不可用时返回False
+        """
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        resumed = self.offset > 0 and status == 206 and \
+            headers.get('Content-Range', '').startswith(f'bytes {self.offset}-')
+        if status != 200 and not resumed:
+            return False
+
+        os.makedirs(os.path.dirname(self.local_path), exist_ok=True)
+        self._hashes = {name: hashlib.new(name) for name in FINGERPRINT_NAMES}
+        if resumed:
+            with open(self.part_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b''):
+                    self._update(chunk)
+            self._expected_size = headers.get('Content-Range', '').rpartition('/')[2]
+            print(f'download: {self.host["uri"]}{self.relative_path} -> resume at {self.offset}')
+        else:
+            self._expected_size = headers.get('Content-Length', '')
+            maven_remove_part(self.part_path)
+            if self.etag or self.last_modified:
+                validator = {'url': self.url, 'etag': self.etag or '',
+                             'last_modified': self.last_modified or ''}
+                with open(self.part_path + '.json', 'w') as file:
+                    json.dump(validator, file)
+        if headers.get('Content-Encoding'):
+            # 压缩传输时Content-Length不是文件大小
+            self._expected_size = ''
+        self._file = open(self.part_path, 'ab' if resumed else 'wb')
+        return True
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._update(chunk)
+
+    def _update(self, chunk: bytes):
+        self.size += len(chunk)
+        for value in self._hashes.values():
+            value.update(chunk)
+
+    def finish(self) -> MavenDownload:
+        """
+        校验大小并重命名为目标文件,
+        不完整时抛出IOError并保留.part文件用于下次续传
+        """
+        self.close()
+        if self._expected_size.isdigit() and int(self._expected_size) != self.size:
+            raise IOError(f'incomplete {self.size}/{self._expected_size}')
+        os.replace(self.part_path, self.local_path)
+        if os.path.exists(self.part_path + '.json'):
+            os.remove(self.part_path + '.json')
+        digests = {name: value.hexdigest() for name, value in self._hashes.items()}
+        return MavenDownload(self.host, self.relative_path, self.local_path, self.size, digests,
+                             self.etag, self.last_modified)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def maven_download_file(host: dict, store_dir: str, relative_path: str,
+                        sessions: MavenSessionPool | None = None,
+                        headers: dict[str, str] | None = None) -> MavenDownload | MavenDownloadFailure:
     """
-    下载maven仓库中文件
+    下载maven仓库中文件, 分块写入.part文件并计算摘要, 完成后原子重命名,
+    中断时不会留下残缺的目标文件; .part文件记录ETag/Last-Modified,
+    下次下载时通过Range请求续传, 仓库源不支持时重新完整下载
     :param host: maven仓库源信息
     :param store_dir: 本地存储根目录
     :param relative_path: 文件相对地址
-    :return: Response | None
-    """
-    print(f'download: {host["uri"]}{relative_path}', end='')
-    auth = None
-    if 'credentials' in host.keys():
-        credentials = host['credentials']
-        credentials_keys = credentials.keys()
-        if 'username' in credentials_keys and 'password' in credentials_keys:
-            username = credentials['username']
-            password = credentials['password']
-            if username and password:
-                auth = HTTPBasicAuth(username, password)
-
-    response = requests.get(os.path.join(host['uri'], relative_path), auth=auth, verify=False)
-    success = False
-    if response.status_code == 200:
-        local_path = os.path.join(store_dir, relative_path)
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
-        with open(local_path, 'wb') as file:
-            file.write(response.content)
-            success = True
-
-    if success:
-        print(' -> success')
-        return response
+    :param sessions: 复用连接的session池, 为空时每次新建连接
+    :param headers: 附加请求头, 条件请求返回304时结果的not_modified为True
+    :return: MavenDownload, 失败时为MavenDownloadFailure
+    """
+    url = os.path.join(host['uri'], relative_path)
+    local_path = os.path.join(store_dir, relative_path)
+    with _download_lock(local_path), (sessions.slot(host) if sessions else nullcontext()):
+        result = _maven_download_part(MavenPartFile(host, relative_path, url, local_path), sessions, headers)
+    maven_print_download(host, relative_path, result)
+    return result
+
+
+def maven_print_download(host: dict, relative_path: str, result: MavenDownload | MavenDownloadFailure):
+    # 并发同步时多线程共用stdout, 一次性输出整行
+    if result and result.not_modified:
+        print(f'download: {host["uri"]}{relative_path} -> not modified')
+    elif result:
+        print(f'download: {host["uri"]}{relative_path} -> success')
     else:
-        print(' -> fail')
-        return None
+        print(f'download: {host["uri"]}{relative_path} -> fail')
 
 
-def maven_download_files(hosts: list, store_dir: str, relative_path: str) -> Response | None:
+def _maven_download_part(part: MavenPartFile, sessions: MavenSessionPool | None,
+                         headers: dict[str, str] | None) -> MavenDownload | MavenDownloadFailure:
+    host = part.host
+    request_headers = part.request_headers(headers)
+    try:
+        if sessions:
+            response = sessions.request(host, 'GET', part.url, headers=request_headers, stream=True)
+        else:
+            response = requests.get(part.url, headers=request_headers, auth=maven_host_auth(host),
+                                    verify=False, stream=True, timeout=DEFAULT_TIMEOUT)
+    except requests.RequestException as e:
+        print(f'download: {host["uri"]}{part.relative_path} -> {e}')
+        return MavenDownloadFailure()
+
+    with response:
+        download = part.not_modified(response.status_code, response.headers)
+        if download:
+            return download
+        if part.restart(response.status_code):
+            response.close()
+            part = MavenPartFile(host, part.relative_path, part.url, part.local_path, False)
+            return _maven_download_part(part, sessions, headers)
+        if not part.open(response.status_code, response.headers):
+            return MavenDownloadFailure(response.status_code)
+        try:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                part.write(chunk)
+            return part.finish()
+        except Exception as e:
+            # 保留.part文件用于下次续传
+            part.close()
+            print(f'download: {host["uri"]}{part.relative_path} -> {e}')
+            return MavenDownloadFailure()
+
+
+class MavenChecksumPolicy:
+    """
+    校验文件获取策略
+    all: 远程下载md5, sha1, sha256, sha512
+    single: 只下载一个远程校验值验证文件, 其余由下载时计算的摘要本地生成
+    单个文件缺少校验文件很常见(如maven-metadata.xml.sha1),
+    同一类型多次404且从未提供过时才跳过该类型
+    :param miss_threshold: 404多少次后认为仓库源不提供该类型
+    """
+    ALL = 'all'
+    SINGLE = 'single'
+    PREFERRED_NAMES = ['sha1', 'sha512', 'sha256', 'md5']
+
+    def __init__(self, mode: str = ALL, miss_threshold: int = 3):
+        assert mode in (MavenChecksumPolicy.ALL, MavenChecksumPolicy.SINGLE)
+        self.mode = mode
+        self.miss_threshold = miss_threshold
+        self._served: dict[str, set[str]] = {}
+        self._missing: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, host: dict) -> list[str]:
+        """
+        按优先级返回该仓库源可能提供的校验类型,
+        已提供过的优先, 确认不提供的跳过
+        """
+        with self._lock:
+            served = self._served.get(host['uri'], set())
+            missing = self._missing.get(host['uri'], {})
+            names = [name for name in MavenChecksumPolicy.PREFERRED_NAMES
+                     if name in served or missing.get(name, 0) < self.miss_threshold]
+        return sorted(names, key=lambda name: name not in served)
+
+    def mark(self, host: dict, name: str, served: bool):
+        """
+        :param served: True为已下载到校验文件, False为仓库源返回404/410;
+                       超时等其他失败不应记录
+        """
+        with self._lock:
+            missing = self._missing.setdefault(host['uri'], {})
+            if served:
+                self._served.setdefault(host['uri'], set()).add(name)
+                missing.pop(name, None)
+            elif name not in self._served.get(host['uri'], set()):
+                missing[name] = missing.get(name, 0) + 1
+
+    def served(self, host: dict) -> set[str]:
+        with self._lock:
+            return set(self._served.get(host['uri'], set()))
+
+
+def maven_download_checksums(host: dict, store_dir: str, download: MavenDownload,
+                             sessions: MavenSessionPool | None = None,
+                             checksum: MavenChecksumPolicy | None = None) -> bool:
+    """
+    获取已下载文件的md5, sha1, sha256, sha512
+    :return: 远程校验值与下载内容不一致时返回False
+    """
+    relative_path = download.relative_path
+    if checksum is None or checksum.mode == MavenChecksumPolicy.ALL:
+        for name in FINGERPRINT_NAMES:
+            maven_download_file(host, store_dir, relative_path + '.' + name, sessions)
+        return True
+
+    verified = None
+    for name in checksum.candidates(host):
+        sidecar = maven_download_file(host, store_dir, relative_path + '.' + name, sessions)
+        if sidecar or sidecar.not_found:
+            checksum.mark(host, name, bool(sidecar))
+        if not sidecar:
+            continue
+        if not maven_verify_checksum(download, sidecar, name):
+            return False
+        verified = name
+        break
+    maven_write_checksums(download, verified)
+    return True
+
+
+def maven_verify_checksum(download: MavenDownload, sidecar: MavenDownload, name: str) -> bool:
+    """
+    比较远程校验文件与下载时计算的摘要, 不一致时删除校验文件
+    """
+    values = sidecar.text.split()
+    remote_digest = values[0].lower() if values else ''
+    if remote_digest != download.digests[name]:
+        print(f'error: checksum mismatch {download.host["uri"]}{download.relative_path}.{name}')
+        os.remove(sidecar.local_path)
+        return False
+    return True
+
+
+def maven_write_checksums(download: MavenDownload, verified: str | None):
+    """
+    用下载时计算的摘要生成已验证类型以外的校验文件
+    """
+    if not verified:
+        print(f'warning: no remote checksum {download.host["uri"]}{download.relative_path}')
+    for name in FINGERPRINT_NAMES:
+        if name != verified:
+            with open(download.local_path + '.' + name, 'w') as file:
+                file.write(download.digests[name])
+
+
+def maven_probe_file(host: dict, relative_path: str, sessions: MavenSessionPool | None = None) -> int:
+    """
+    探测仓库源是否存在文件, 优先HEAD, 不支持HEAD时使用只取1字节的Range GET;
+    不占用仓库源的并发名额(slot), 落选后仍在执行的探测不会阻塞随后的下载
+    :return: 响应状态码, 200/206表示存在, 见NOT_FOUND_STATUS
+    """
+    url = os.path.join(host['uri'], relative_path)
+    if sessions:
+        response = sessions.request(host, 'HEAD', url, allow_redirects=True)
+    else:
+        response = requests.head(url, auth=maven_host_auth(host), verify=False, allow_redirects=True,
+                                 timeout=DEFAULT_TIMEOUT)
+    if response.status_code in (405, 501):
+        headers = {'Range': 'bytes=0-0'}
+        if sessions:
+            response = sessions.request(host, 'GET', url, headers=headers, stream=True)
+        else:
+            response = requests.get(url, headers=headers, auth=maven_host_auth(host), verify=False,
+                                    stream=True, timeout=DEFAULT_TIMEOUT)
+        response.close()
+    return response.status_code
+
+
+def maven_race_hosts(hosts: list, relative_path: str, sessions: MavenSessionPool | None = None,
+                     router: MavenHostRouter | None = None) -> tuple[dict | None, list]:
+    """
+    同时向多个仓库源探测文件, 取最先命中的仓库源;
+    落选的探测无法中断, 放弃等待并在后台执行完毕, 结果丢弃
+    :return: (命中的仓库源, 确认不存在文件(404/410)的仓库源),
+             其余失败的仓库源仍可按顺序尝试
+    """
+    missed = []
+    winner = None
+    executor = ThreadPoolExecutor(max_workers=len(hosts))
+    futures = {executor.submit(maven_probe_file, host, relative_path, sessions): host for host in hosts}
+    try:
+        for future in as_completed(futures):
+            host = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                print(f'probe: {host["uri"]}{relative_path} -> {e}')
+                continue
+            if status in (200, 206):
+                winner = host
+                break
+            if status in NOT_FOUND_STATUS:
+                missed.append(host)
+                if router:
+                    router.miss(host, relative_path)
+    finally:
+        executor.shutdown(wait=False)
+    print(f'probe: {relative_path} -> {winner["uri"] if winner else "none"}')
+    return winner, missed
+
+
+def maven_download_files(hosts: list, store_dir: str, relative_path: str,
+                         sessions: MavenSessionPool | None = None,
+                         checksum: MavenChecksumPolicy | None = None,
+                         router: MavenHostRouter | None = None,
+                         race: int = 0) -> MavenDownload | None:
     """
     下载maven仓库中文件和md5, sha1, sha256, sh512
+    :param router: 仓库源路由, 优先尝试已知提供该groupId的仓库源,
+                   并跳过近期未命中的仓库源
+    :param race: 路由未知时同时探测的仓库源数量, 小于2时按顺序逐个尝试
     """
-    fingerprint = ['md5', 'sha1', 'sha256', 'sha512']
-    response = None
+    if sessions:
+        # 跳过熔断中的仓库源, 响应快的优先
+        hosts = sessions.health.order(hosts)
+    if router:
+        hosts = router.order(hosts, relative_path)
+    if race > 1 and len(hosts) > 1 and not (router and router.route(relative_path)):
+        winner, missed = maven_race_hosts(hosts[:race], relative_path, sessions, router)
+        hosts = [host for host in hosts if host is not winner and host not in missed]
+        if winner:
+            hosts.insert(0, winner)
     for host in hosts:
-        response = maven_download_file(host, store_dir, relative_path)
+        response = maven_download_file(host, store_dir, relative_path, sessions)
         if response:
-            for name in fingerprint:
-                maven_download_file(host, store_dir, relative_path + '.' + name)
-            break
-    if not response:
-        print(f'error: download fail {relative_path}')
-    return response
+            if maven_download_checksums(host, store_dir, response, sessions, checksum):
+                if router:
+                    router.hit(host, relative_path)
+                return response
+            os.remove(response.local_path)
+        elif router and response.not_found:
+            # 5xx, 超时, 熔断和传输中断不写入负缓存, 下次仍可重试或续传
+            router.miss(host, relative_path)
+    print(f'error: download fail {relative_path}')
+    return None
 
 
 class MavenHost:
     """
     Maven 信息
+    :param pool_size: 每个仓库源的连接池大小
+    :param keep_alive: 是否复用长连接
+    :param checksum_mode: 校验文件获取策略, 见MavenChecksumPolicy
+    :param miss_ttl: 仓库源未命中负缓存有效期(秒),
+                     路由表和负缓存保存在store_dir/.routing.json
+    :param race_hosts: 路由未知时同时探测的仓库源数量, 0表示按顺序逐个尝试
+    :param metadata_ttl: maven-metadata.xml本地有效期(秒), 过期后发起条件请求重新验证,
+                         单个仓库源可在hosts中用'metadata_ttl'覆盖
+    :param use_index: 使用本地仓库索引判断文件是否存在, 见MavenStoreIndex
+    :param use_symbol_index: 下载jar/aar后更新类名索引, 见MavenSymbolIndex
+    :param timeout: (连接超时, 读取超时)秒
+    :param retries: 连接失败, 超时及5xx时的重试次数
+    :param failure_threshold: 仓库源连续失败多少次后熔断
+    :param cooldown: 熔断冷却时间(秒)
     """
 
-    def __init__(self, hosts: list, store_dir: str):
+    def __init__(self, hosts: list, store_dir: str, pool_size: int = 16, keep_alive: bool = True,
+                 checksum_mode: str = MavenChecksumPolicy.ALL, miss_ttl: float = 24 * 60 * 60,
+                 race_hosts: int = 0, metadata_ttl: float = 10000 * 60, use_index: bool = False,
+                 timeout: tuple[float, float] = DEFAULT_TIMEOUT, retries: int = 2, failure_threshold: int = 5,
+                 cooldown: float = 60.0, use_symbol_index: bool = False):
         self.hosts = hosts
         self.store_dir = store_dir
+        self.sessions = MavenSessionPool(pool_size=pool_size, keep_alive=keep_alive, timeout=timeout,
+                                         retries=retries,
+                                         health=MavenHostHealth(failure_threshold=failure_threshold,
+                                                                cooldown=cooldown))
+        self.checksum = MavenChecksumPolicy(checksum_mode)
+        self.router = MavenHostRouter(os.path.join(store_dir, '.routing.json'), miss_ttl=miss_ttl)
+        self.race_hosts = race_hosts
+        self.metadata_ttl = metadata_ttl
+        self.validators = MavenValidatorStore(os.path.join(store_dir, '.validators.json'))
+        self.index = MavenStoreIndex(store_dir) if use_index else None
+        self.symbols = MavenSymbolIndex(store_dir) if use_symbol_index else None
+        self.downloaded_files = 0
+        self.downloaded_bytes = 0
+        self._stats_lock = threading.Lock()
+
+    def download_files(self, relative_path: str) -> MavenDownload | None:
+        download = maven_download_files(self.hosts, self.store_dir, relative_path, self.sessions,
+                                        self.checksum, self.router, self.race_hosts)
+        if download:
+            self.record_download(download)
+        else:
+            self.local_forget(relative_path)
+        return download
+
+    def record_download(self, download: MavenDownload):
+        """
+        统计下载量并增量更新本地仓库索引
+        """
+        with self._stats_lock:
+            self.downloaded_files += 1
+            self.downloaded_bytes += download.size
+        self.index_download(download)
+
+    def index_download(self, download: MavenDownload):
+        """
+        下载完成后增量更新本地仓库索引和类名索引
+        """
+        if self.index:
+            self.index.update(download.relative_path, download.digests.get('sha1'))
+            for name in FINGERPRINT_NAMES:
+                self.index.update(download.relative_path + '.' + name, '')
+        if self.symbols:
+            self.symbols.update(download.relative_path)
+
+    def local_exists(self, relative_path: str, verify: bool = False) -> bool:
+        """
+        :param verify: 索引中存在时再确认磁盘上的文件,
+                       已被删除时删除过期的索引记录
+        """
+        local_path = os.path.join(self.store_dir, relative_path)
+        if self.index:
+            if not self.index.exists(relative_path):
+                return False
+            if not verify or os.path.exists(local_path):
+                return True
+            self.local_forget(relative_path)
+            return False
+        return os.path.exists(local_path)
+
+    def local_forget(self, relative_path: str):
+        """
+        本地文件被删除或读取失败后, 按磁盘当前状态更新索引, 之后按未下载处理
+        """
+        if self.index:
+            self.index.update(relative_path)
+
+    def local_mtime(self, relative_path: str) -> float | None:
+        if self.index:
+            stat = self.index.stat(relative_path)
+            return stat[1] if stat else None
+        local_path = os.path.join(self.store_dir, relative_path)
+        return os.path.getmtime(local_path) if os.path.exists(local_path) else None
+
+    def find_host(self, uri: str) -> dict | None:
+        for host in self.hosts:
+            if host['uri'] == uri:
+                return host
+        return None
 
+    def metadata_ttl_of(self, uri: str | None) -> float:
+        host = self.find_host(uri) if uri else None
+        if host and 'metadata_ttl' in host.keys():
+            return host['metadata_ttl']
+        return self.metadata_ttl
 
-class MavenDependency:
+    def metadata_ttl_for(self, metadata_path: str) -> float:
+        """
+        按下载该metadata文件的仓库源取有效期
+        """
+        validator = self.validators.get(metadata_path)
+        return self.metadata_ttl_of(validator['uri'] if validator else None)
+
+    def save(self):
+        """
+        持久化同步过程中学习到的状态
+        """
+        self.router.save()
+        self.validators.save()
+
+
+class MavenModelCache:
     """
-    Maven 依赖信息
+    进程内共享的已解析pom/metadata缓存, LRU淘汰, 同一个parent pom每次运行只解析一次
+    :param max_size: 最多缓存的对象数
     """
 
-    def __init__(self):
-        self.group_id = ''
-        self.artifact_id = ''
-        self.version = ''
-        self.scope = ''
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple, object] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get(self, *keys: tuple):
+        """
+        按顺序查找, 返回第一个命中的对象
+        """
+        with self._lock:
+            for key in keys:
+                value = self._items.get(key)
+                if value is not None:
+                    self.hits += 1
+                    self._items.move_to_end(key)
+                    return value
+            self.misses += 1
+            return None
+
+    @staticmethod
+    def keys(kind: str, store_dir: str, path: str, is_download: bool) -> tuple[tuple, ...]:
+        """
+        下载模式解析的对象也可用于离线查询,
+        离线解析的对象可能缺少未下载的parent, 只用于离线查询
+        """
+        key = (kind, store_dir, path, True)
+        return (key,) if is_download else (key, (kind, store_dir, path, False))
+
+    def put(self, key: tuple, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def enter(self, key: tuple) -> bool:
+        """
+        标记当前线程正在解析key, 已在解析中说明存在parent环
+        """
+        parsing = getattr(self._local, 'parsing', None)
+        if parsing is None:
+            parsing = self._local.parsing = set()
+        if key in parsing:
+            return False
+        parsing.add(key)
+        return True
+
+    def leave(self, key: tuple):
+        self._local.parsing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def print_stats(self):
+        print(f'model cache: size={len(self._items)} hits={self.hits} misses={self.misses}')
+
+
+maven_model_cache = MavenModelCache()
+
+
+class MavenDependency:
+    """
+    Maven 依赖信息, 不可变可哈希, 通过of()获取驻留的共享实例
+    """
+    __slots__ = ('group_id', 'artifact_id', 'version', 'scope', '_key', '_hash')
+
+    _interned: dict[tuple, MavenDependency] = {}
+
+    def __init__(self, group_id: str = '', artifact_id: str = '', version: str = '', scope: str = ''):
+        self.group_id = sys.intern(group_id)
+        self.artifact_id = sys.intern(artifact_id)
+        self.version = sys.intern(version)
+        self.scope = sys.intern(scope)
+        self._key = (self.group_id, self.artifact_id, self.version, self.scope)
+        self._hash = hash(self._key)
+
+    @classmethod
+    def of(cls, group_id: str, artifact_id: str, version: str = '', scope: str = '') -> MavenDependency:
+        key = (group_id, artifact_id, version, scope)
+        dependency = cls._interned.get(key)
+        if dependency is None:
+            dependency = cls._interned.setdefault(key, cls(group_id, artifact_id, version, scope))
+        return dependency
+
+    @property
+    def path(self) -> str:
+        """
+        group:artifact:version
+        """
+        return ':'.join([self.group_id, self.artifact_id, self.version])
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, MavenDependency):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f'MavenDependency({self.path}, {self.scope})'
 
 
 class MavenMetadata:
@@ -107,21 +756,62 @@ class MavenMetadata:
     def sync(self, is_download: bool = True) -> bool:
         metadata_text = ''
         local_metadata = os.path.join(self.host.store_dir, self.metadata_path)
-        if os.path.exists(local_metadata):
-            modify_time = os.path.getmtime(local_metadata)
+        validator = self.host.validators.get(self.metadata_path)
+        modify_time = self.host.local_mtime(self.metadata_path)
+        if modify_time is not None:
             cur_time = time.time().real
-            if cur_time - modify_time < 10000 * 60:
-                with open(local_metadata, 'r') as file:
-                    metadata_text = file.read()
+            ttl = self.host.metadata_ttl_for(self.metadata_path)
+            if not is_download or cur_time - modify_time < ttl:
+                try:
+                    with open(local_metadata, 'r') as file:
+                        metadata_text = file.read()
+                except FileNotFoundError:
+                    # 索引记录过期, 文件已被删除
+                    self.host.local_forget(self.metadata_path)
+            elif validator:
+                metadata_text = self._revalidate(validator)
         if is_download and len(metadata_text) == 0:
-            metadata_resp = maven_download_files(self.host.hosts, self.host.store_dir, self.metadata_path)
+            metadata_resp = self.host.download_files(self.metadata_path)
             if metadata_resp:
+                self.host.validators.put(self.metadata_path, metadata_resp.host['uri'], metadata_resp.etag,
+                                         metadata_resp.last_modified)
                 metadata_text = metadata_resp.text
         if len(metadata_text) > 0:
             return self._parser_metadata(metadata_text)
         else:
             return False
 
+    def _revalidate(self, validator: dict) -> str:
+        """
+        向原仓库源发起条件请求, 304时刷新本地文件时间, 否则按新内容更新
+        """
+        host = self.host.find_host(validator['uri'])
+        headers = MavenValidatorStore.headers(validator)
+        if not host or not headers:
+            return ''
+        metadata_resp = maven_download_file(host, self.host.store_dir, self.metadata_path, self.host.sessions,
+                                            headers)
+        if not metadata_resp:
+            return ''
+        if metadata_resp.not_modified:
+            try:
+                os.utime(metadata_resp.local_path)
+            except FileNotFoundError:
+                self.host.local_forget(self.metadata_path)
+                return ''
+            if self.host.index:
+                self.host.index.update(self.metadata_path)
+        elif not maven_download_checksums(host, self.host.store_dir, metadata_resp, self.host.sessions,
+                                          self.host.checksum):
+            os.remove(metadata_resp.local_path)
+            self.host.local_forget(self.metadata_path)
+            return ''
+        else:
+            self.host.index_download(metadata_resp)
+        self.host.validators.put(self.metadata_path, host['uri'], metadata_resp.etag or validator['etag'],
+                                 metadata_resp.last_modified or validator['last_modified'])
+        return metadata_resp.text
+
     def _parser_metadata(self, content: str) -> bool:
         root = etree.fromstring(content)
         if root.tag != 'metadata':
@@ -151,12 +841,63 @@ class MavenMetadata:
         return True
 
 
+PROPERTY_PATTERN = re.compile(r'\$\{([^${}]+)}')
+
+
+def maven_interpolate(text: str, properties: dict[str, str]) -> str:
+    """
+    替换文本中的${...}, 支持一段文本中多个占位符及${a.${b}}嵌套,
+    未定义的占位符保持原样
+    """
+    for _ in range(8):
+        if '${' not in text:
+            break
+        value = PROPERTY_PATTERN.sub(lambda match: properties.get(match.group(1), match.group(0)), text)
+        if value == text:
+            break
+        text = value
+    return text
+
+
+def maven_resolve_properties(raw_properties: dict[str, str]) -> dict[str, str]:
+    """
+    展开properties之间的相互引用, 每个属性只展开一次, 循环引用保持原样
+    """
+    resolved: dict[str, str] = {}
+    resolving: set[str] = set()
+
+    def replace(match) -> str:
+        key = match.group(1)
+        if key not in raw_properties or key in resolving:
+            return match.group(0)
+        return resolve(key)
+
+    def resolve(key: str) -> str:
+        value = resolved.get(key)
+        if value is None:
+            value = raw_properties[key]
+            if '${' in value:
+                resolving.add(key)
+                for _ in range(8):
+                    new_value = PROPERTY_PATTERN.sub(replace, value)
+                    if new_value == value:
+                        break
+                    value = new_value
+                resolving.discard(key)
+            resolved[key] = value
+        return value
+
+    for name in raw_properties.keys():
+        resolve(name)
+    return resolved
+
+
 class MavenPom:
     """
     Maven Pom文件信息&处理
     """
 
-    def __init__(self, host: MavenHost, pom_path: str, synced_poms: list[str] | None = None):
+    def __init__(self, host: MavenHost, pom_path: str, synced_poms: set[str] | None = None):
         self.host = host
         self.pom_path = pom_path
         self.synced_poms = synced_poms
@@ -167,23 +908,31 @@ class MavenPom:
         self.packaging = ''
         self.root_dir = ''
         self.parent_pom: MavenPom | None = None
-        self.properties = {str: str}
-        self._dependencies: list[MavenDependency] = []
+        # 继承合并后的原始properties, 以及展开后的effective properties
+        self.raw_properties: dict[str, str] = {}
+        self.properties: dict[str, str] = {}
+        # dict作为有序集合, 保持声明顺序
+        self._dependencies: dict[MavenDependency, None] = {}
+        self._all_dependencies: list[MavenDependency] | None = None
 
     def sync(self, is_download: bool = True) -> bool:
         # 防止pom parent死循环
-        if self.synced_poms:
+        if self.synced_poms is not None:
             if self.pom_path in self.synced_poms:
                 return False
-            self.synced_poms.append(self.pom_path)
+            self.synced_poms.add(self.pom_path)
 
         pom_text = ''
         local_pom = os.path.join(self.host.store_dir, self.pom_path)
-        if os.path.exists(local_pom):
-            with open(local_pom, 'r') as file:
-                pom_text = file.read()
+        if self.host.local_exists(self.pom_path):
+            try:
+                with open(local_pom, 'r') as file:
+                    pom_text = file.read()
+            except FileNotFoundError:
+                # 索引记录过期, 文件已被删除
+                self.host.local_forget(self.pom_path)
         if is_download and len(pom_text) == 0:
-            pom_resp = maven_download_files(self.host.hosts, self.host.store_dir, self.pom_path)
+            pom_resp = self.host.download_files(self.pom_path)
             if pom_resp:
                 pom_text = pom_resp.text
         if len(pom_text) > 0:
@@ -225,42 +974,45 @@ class MavenPom:
                 if len(parent_group_id) > 0 and len(parent_artifact_id) > 0:
                     path = f'{parent_group_id}:{parent_artifact_id}:{parent_version}'
                     impl = MavenImplementation(self.host, path)
-                    impl.sync_metadata()
+                    impl.sync_metadata(is_download)
                     if impl.sync_pom(is_download=is_download, synced_poms=self.synced_poms):
                         self.parent_pom = impl.pom
 
-        self.group_id = parent_group_id
-        self.artifact_id = parent_artifact_id
-        self.version = parent_version
-
-        # properties
-        self.properties.clear()
-        self.properties['project.groupId'] = self.group_id
-        self.properties['project.artifactId'] = self.artifact_id
-        self.properties['project.version'] = self.version
+        # effective pom: 合并parent与自身的原始properties后一次性展开,
+        # 之后的节点文本只需单次替换
+        raw_properties = dict(self.parent_pom.raw_properties) if self.parent_pom else {}
         for node1 in root:
             if node1.tag == ns + 'properties':
                 for node2 in node1:
-                    text2 = self._parser_node_text(node2.text)
-                    if node2.tag and text2:
-                        self.properties[node2.tag[len(ns):]] = node2.text.strip()
+                    if isinstance(node2.tag, str) and node2.text:
+                        raw_properties[node2.tag[len(ns):]] = node2.text.strip()
+        project_values = {'groupId': parent_group_id, 'artifactId': '', 'version': parent_version}
+        for node1 in root:
+            if node1.tag[len(ns):] in project_values.keys() and node1.text:
+                project_values[node1.tag[len(ns):]] = node1.text.strip()
+        for key, value in project_values.items():
+            raw_properties['project.' + key] = value
+            raw_properties['pom.' + key] = value
+        for key, value in (('groupId', parent_group_id), ('artifactId', parent_artifact_id),
+                           ('version', parent_version)):
+            raw_properties['parent.' + key] = value
+            raw_properties['project.parent.' + key] = value
+        self.raw_properties = raw_properties
+        self.properties = maven_resolve_properties(raw_properties)
 
+        self.group_id = parent_group_id
+        self.artifact_id = parent_artifact_id
+        self.version = parent_version
         for node1 in root:
-            text = node1.text
-            if not text:
-                text = ''
-            text = self._parser_node_text(text.strip())
+            text = self._parser_node_text(node1.text)
             if node1.tag == ns + 'modelVersion':
                 self.model_version = text
             elif node1.tag == ns + 'groupId':
                 self.group_id = text
-                self.properties['project.groupId'] = self.group_id
             elif node1.tag == ns + 'artifactId':
                 self.artifact_id = text
-                self.properties['project.artifactId'] = self.artifact_id
             elif node1.tag == ns + 'version':
                 self.version = text.strip('[]')
-                self.properties['project.version'] = self.version
             elif node1.tag == ns + 'packaging':
                 self.packaging = text
             elif node1.tag == ns + 'dependencies':
@@ -281,52 +1033,37 @@ class MavenPom:
         return True
 
     def _parser_dependency(self, ns, node):
-        deps = MavenDependency()
+        group_id = ''
+        artifact_id = ''
+        version = ''
+        scope = ''
         for node1 in node:
-            text = self._parser_node_text(node1.text.strip())
+            text = self._parser_node_text(node1.text)
             if node1.tag == ns + 'groupId':
-                deps.group_id = text
+                group_id = text
             elif node1.tag == ns + 'artifactId':
-                deps.artifact_id = text
+                artifact_id = text
             elif node1.tag == ns + 'version':
-                deps.version = text.strip('[]')
+                version = maven_normalize_version(text)
             elif node1.tag == ns + 'scope':
-                deps.scope = text
-        if len(deps.group_id) > 0 and len(deps.artifact_id) > 0:
-            if not (deps in self._dependencies):
-                self._dependencies.append(deps)
+                scope = text
+        if len(group_id) > 0 and len(artifact_id) > 0:
+            self._dependencies[MavenDependency.of(group_id, artifact_id, version, scope)] = None
 
-    def _parser_node_text(self, text):
+    def _parser_node_text(self, text: str | None) -> str:
         if not text:
             return ''
-        result = re.match(r'\$\{(.+)}', text)
-        if result:
-            key = result.group(1)
-            if key in self.properties.keys():
-                value = self.properties[key]
-            else:
-                value = None
-            parent = self.parent_pom
-            while parent is not None and value is None:
-                if key in parent.properties.keys():
-                    value = parent.properties[key]
-                parent = parent.parent_pom
-            if value:
-                return value
-        return text
+        return maven_interpolate(text.strip(), self.properties)
 
     def maven_dependencies(self) -> list[MavenDependency]:
-        deps = []
-        if self.parent_pom:
-            dep_list = self.parent_pom.maven_dependencies()
-            if dep_list:
-                for dep in dep_list:
-                    if not (dep in deps):
-                        deps.append(dep)
-        for dep in self._dependencies:
-            if not (dep in deps):
-                deps.append(dep)
-        return deps
+        # 解析完成后pom不再变化, 合并结果只计算一次
+        if self._all_dependencies is None:
+            deps: dict[MavenDependency, None] = {}
+            if self.parent_pom:
+                deps.update(dict.fromkeys(self.parent_pom.maven_dependencies()))
+            deps.update(self._dependencies)
+            self._all_dependencies = list(deps)
+        return self._all_dependencies
 
     def maven_artifact_path(self):
         if len(self.packaging) == 0 or self.packaging == 'bundle':
@@ -363,25 +1100,43 @@ class MavenImplementation:
         self.metadata_path = os.path.join(self.root_dir, 'maven-metadata.xml')
 
     def sync_metadata(self, is_download: bool = True) -> bool:
-        metadata = MavenMetadata(self.host, self.metadata_path)
-        if metadata.sync(is_download):
-            self.metadata = metadata
-            return True
-        return False
+        keys = MavenModelCache.keys('metadata', self.host.store_dir, self.metadata_path, is_download)
+        metadata = maven_model_cache.get(*keys)
+        if metadata is None:
+            key = keys[-1]
+            metadata = MavenMetadata(self.host, self.metadata_path)
+            if not metadata.sync(is_download):
+                return False
+            maven_model_cache.put(key, metadata)
+        self.metadata = metadata
+        return True
 
-    def sync_pom(self, is_download: bool = True, synced_poms: list[str] | None = None) -> bool:
-        pom_path = self._pom_path()
-        if pom_path:
-            pom = MavenPom(self.host, pom_path, synced_poms)
-            if pom.sync(is_download):
-                self.pom = pom
-                return True
-        return False
+    def sync_pom(self, is_download: bool = True, synced_poms: set[str] | None = None) -> bool:
+        pom_path = self.pom_path()
+        if not pom_path:
+            return False
+        keys = MavenModelCache.keys('pom', self.host.store_dir, pom_path, is_download)
+        pom = maven_model_cache.get(*keys)
+        if pom is None:
+            key = keys[-1]
+            # 防止pom parent死循环
+            if not maven_model_cache.enter(key):
+                return False
+            try:
+                pom = MavenPom(self.host, pom_path, synced_poms)
+                if not pom.sync(is_download):
+                    return False
+                maven_model_cache.put(key, pom)
+            finally:
+                maven_model_cache.leave(key)
+        self.pom = pom
+        return True
 
-    def _pom_path(self):
+    def pom_path(self):
         version = None
         if len(self.version) > 0:
-            version = self.version
+            # 版本范围在metadata的可用版本中选择
+            version = maven_select_version(self.version, self.metadata.versions if self.metadata else [])
         elif self.metadata:
             if len(self.metadata.release_version) > 0:
                 version = self.metadata.release_version
@@ -398,138 +1153,351 @@ class MavenImplementation:
         if not self.pom:
             return False
         artifact_path = self.pom.maven_artifact_path()
-        local_artifact = os.path.join(self.host.store_dir, artifact_path)
-        if os.path.exists(local_artifact):
+        if self.host.local_exists(artifact_path, verify=True):
             return True
-        artifact_resp = maven_download_files(self.host.hosts, self.host.store_dir, artifact_path)
+        artifact_resp = self.host.download_files(artifact_path)
         if artifact_resp:
             source_jar_url = self.pom.maven_source_jar_path()
-            maven_download_files(self.host.hosts, self.host.store_dir, source_jar_url)
+            self.host.download_files(source_jar_url)
             return True
         return False
 
 
 class MavenSyncer:
-    def __init__(self, host: MavenHost, sync_depe: bool = True):
+    """
+    Maven 依赖同步
+    :param max_workers: 同时同步的节点数上限, 大于1时启用并发遍历
+    :param use_lock_file: 使用依赖图锁文件, 未变化的节点直接复用上次解析结果
+    :param engine: thread使用线程池(max_workers),
+                   asyncio使用单线程异步下载(需要aiohttp), 见MavenAsyncEngine
+    :param mediation: 下载前先做版本仲裁(nearest | highest),
+                      每个group:artifact只同步一个版本, 见MavenVersionResolver
+    """
+    ENGINE_THREAD = 'thread'
+    ENGINE_ASYNCIO = 'asyncio'
+
+    def __init__(self, host: MavenHost, sync_depe: bool = True, max_workers: int = 1,
+                 use_lock_file: bool = False, engine: str = ENGINE_THREAD, mediation: str | None = None):
+        assert engine in (MavenSyncer.ENGINE_THREAD, MavenSyncer.ENGINE_ASYNCIO)
         self.host = host
         self.sync_depe = sync_depe
-        self.paths = []
+        self.max_workers = max_workers
+        self.engine = engine
+        self.paths: set[str] = set()
+        self._paths_lock = threading.Lock()
+        self.graph_lock = MavenGraphLock(host.store_dir) if use_lock_file else None
+        # 批量同步断点, 见MavenSyncCheckpoint
+        self.checkpoint: MavenSyncCheckpoint | None = None
+        self.resolver = MavenVersionResolver(host, mediation, max_workers) if mediation else None
 
     def sync(self, path: str):
-        self._sync(path, 0)
+        self.syncs([path])
+
+    def syncs(self, paths: list[str]):
+        """
+        同步多个根节点, 共享已同步节点, 并发时所有根节点进入同一个frontier
+        """
+        if self.graph_lock:
+            for path in paths:
+                self.graph_lock.load(path)
+        if self.resolver and self.sync_depe:
+            self.resolver.resolve(paths)
+        try:
+            if self.engine == MavenSyncer.ENGINE_ASYNCIO:
+                # 按需导入, 只有使用asyncio引擎时才依赖aiohttp
+                from repository_async import MavenAsyncEngine
+                asyncio.run(MavenAsyncEngine(self).sync(paths))
+            elif self.max_workers > 1:
+                self._sync_concurrent(paths)
+            else:
+                for path in paths:
+                    self._sync(path, 0)
+        finally:
+            if self.graph_lock:
+                for path in paths:
+                    self.graph_lock.save(path)
+            self.host.save()
 
     def _sync(self, path: str, deep: int):
-        print(f'sync: {path}')
         # 解决依赖环
-        if path in self.paths:
+        if not self.mark_path(path):
             return
-        self.paths.append(path)
+        for depe_path in self._sync_node(path):
+            self._sync(depe_path, deep + 1)
+
+    def _sync_concurrent(self, paths: list[str]):
+        """
+        并发遍历依赖图, frontier中的节点提交到线程池, 完成后再把其依赖加入frontier
+        """
+        frontier = deque(paths)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while frontier or pending:
+                while frontier:
+                    node_path = frontier.popleft()
+                    # 解决依赖环
+                    if self.mark_path(node_path):
+                        future = executor.submit(self._sync_node, node_path)
+                        future.path = node_path
+                        pending.add(future)
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        frontier.extend(future.result())
+                    except Exception as e:
+                        print(f'error: sync fail {future.path}, {e}')
+
+    def mark_path(self, path: str) -> bool:
+        print(f'sync: {path}')
+        with self._paths_lock:
+            if path in self.paths:
+                return False
+            self.paths.add(path)
+            return True
+
+    def _sync_node(self, path: str) -> list[str]:
+        """
+        同步单个节点的metadata, pom, artifact
+        :return: 需要继续同步的依赖
+        """
+        depe_paths = self.replay_node(path)
+        if depe_paths is None:
+            impl = MavenImplementation(self.host, path)
+            impl.sync_metadata()
+            impl.sync_pom()
+            artifact_synced = impl.sync_artifact()
+            depe_paths = self.record_node(path, impl, artifact_synced)
+        return self.next_paths(depe_paths)
+
+    def next_paths(self, depe_paths: list[str]) -> list[str]:
+        """
+        需要继续同步的依赖, 启用版本仲裁时替换为被选中的版本
+        """
+        if not self.sync_depe:
+            return []
+        if self.resolver:
+            return [self.resolver.select(path) for path in depe_paths]
+        return depe_paths
+
+    def replay_node(self, path: str) -> list[str] | None:
+        """
+        从断点或依赖图锁文件中取节点的依赖, 没有记录或已变化时返回None
+        """
+        if self.checkpoint:
+            depe_paths = self.checkpoint.get(path)
+            if depe_paths is not None:
+                return depe_paths
+        if self.graph_lock:
+            depe_paths = self.graph_lock.replay(path, self.host.metadata_ttl_for)
+            if depe_paths is not None:
+                if self.checkpoint:
+                    self.checkpoint.done(path, depe_paths)
+                return depe_paths
+        return None
+
+    def record_node(self, path: str, impl: MavenImplementation, artifact_synced: bool) -> list[str]:
+        """
+        记录已同步节点到依赖图锁文件和断点
+        :return: 节点的依赖
+        """
+        if not impl.pom:
+            return []
+        depe_paths = [depe.path for depe in impl.pom.maven_dependencies()]
+        if self.graph_lock and artifact_synced:
+            pom_paths = []
+            pom = impl.pom
+            while pom:
+                pom_paths.append(pom.pom_path)
+                pom = pom.parent_pom
+            metadata_path = '' if impl.version and not maven_is_range(impl.version) else impl.metadata_path
+            self.graph_lock.record(path, pom_paths, impl.pom.maven_artifact_path(), metadata_path, depe_paths)
+        # artifact下载失败的节点不记录, 恢复时重新同步
+        if self.checkpoint and artifact_synced:
+            self.checkpoint.done(path, depe_paths)
+        return depe_paths
+
+
+MAVEN_HOSTS = [
+    {'uri': 'https://maven.scijava.org/content/repositories/public/'},
+    {'uri': 'https://jfrog.anythinktech.com/artifactory/overseas_sdk/'},
+    {
+        'uri': 'https://maven.cherrysoft.cn/repository/maven-releases/',
+        'credentials': {
+            'username': 'develop',
+            'password': 'qwert12345'
+        }
+    },
+    # {'uri': 'https://maven.singular.net/'},
+    {'uri': 'https://artifact.bytedance.com/repository/pangle/'},
+    {'uri': 'https://maven.google.com/', 'max_concurrency': 8, 'rate_limit': 20},
+    {'uri': 'https://dl.google.com/dl/android/maven2/'},
+    {'uri': 'https://repo1.maven.org/maven2/'},
+    {'uri': 'https://jcenter.bintray.com/'},
+    {'uri': 'https://jitpack.io/'},
+    {'uri': 'https://maven.scijava.org/content/repositories/public/'},
+    {'uri': 'https://dl-maven-android.mintegral.com/repository/mbridge_android_sdk_oversea/'},
+    {'uri': 'https://maven.scijava.org/content/repositories/public/'},
+    {'uri': 'https://maven.aliyun.com/repository/google/', 'max_concurrency': 8, 'rate_limit': 20},
+    {'uri': 'https://maven.aliyun.com/repository/public/', 'max_concurrency': 8, 'rate_limit': 20},
+    {'uri': 'https://mvnrepository.com/'},
+]
+
+
+class MavenDependencyGraph:
+    """
+    离线解析一次的依赖图, path -> 依赖path列表, pom无法解析的节点为None
+    :param graph_lock: 可选的依赖图锁文件, 未变化的节点直接使用锁文件中的依赖
+    """
+
+    def __init__(self, host: MavenHost, graph_lock: MavenGraphLock | None = None):
+        self.host = host
+        self.graph_lock = graph_lock
+        self.nodes: dict[str, list[str] | None] = {}
+
+    def resolve(self, paths: list[str]):
+        stack = list(paths)
+        while stack:
+            path = stack.pop()
+            if not path or path in self.nodes:
+                continue
+            if self.graph_lock:
+                self.graph_lock.load(path)
+            deps = self._resolve_node(path)
+            self.nodes[path] = deps
+            if deps:
+                stack.extend(deps)
+
+    def _resolve_node(self, path: str) -> list[str] | None:
+        if self.graph_lock:
+            deps = self.graph_lock.replay(path, self.host.metadata_ttl_for)
+            if deps is not None:
+                return deps
         impl = MavenImplementation(self.host, path)
-        impl.sync_metadata()
-        impl.sync_pom()
-        impl.sync_artifact()
-        if impl.pom and self.sync_depe:
-            depe_list = impl.pom.maven_dependencies()
-            if depe_list:
-                for depe in depe_list:
-                    depe_path = ":".join([depe.group_id, depe.artifact_id, depe.version])
-                    self._sync(depe_path, deep + 1)
+        impl.sync_metadata(False)
+        impl.sync_pom(is_download=False)
+        if not impl.pom:
+            return None
+        return [depe.path for depe in impl.pom.maven_dependencies()]
+
+    def dependencies(self, path: str) -> list[str] | None:
+        if path not in self.nodes:
+            self.resolve([path])
+        return self.nodes[path]
+
+    def reachable(self, paths: list[str]) -> list[str]:
+        """
+        从根节点可达的所有节点, 按首次访问顺序
+        """
+        self.resolve(paths)
+        result: dict[str, None] = {}
+        stack = list(reversed(paths))
+        while stack:
+            path = stack.pop()
+            if not path or path in result:
+                continue
+            result[path] = None
+            deps = self.nodes.get(path)
+            if deps:
+                stack.extend(reversed(deps))
+        return list(result)
 
 
 class DependencyPrinter:
+    """
+    依赖打印, 先解析依赖图再渲染, 输出逐行写入output
+    :param max_depth: 最大打印深度, None不限制
+    :param output: 输出流, 默认stdout
+    """
     ADD_TAG = '+--- '
     END_TAG = '\\--- '
     CON_TAG = '|' + ' ' * 4
     EMPTY_TAG = ' ' * 5
 
-    def __init__(self, host: MavenHost):
+    def __init__(self, host: MavenHost, max_depth: int | None = None, output: TextIO | None = None,
+                 graph_lock: MavenGraphLock | None = None):
         self.host = host
-        self.paths = []
-        self.tags = []
+        self.max_depth = max_depth
+        self.output = output or sys.stdout
+        self.graph = MavenDependencyGraph(host, graph_lock)
+        self.paths: set[str] = set()
 
     def print(self, path: str):
         self.prints([path])
 
     def prints(self, paths: list[str]):
-        print('dependency')
-        for path in paths:
-            self.tags.clear()
-            self._print(path, 0, path == paths[-1])
-
-    def _print(self, path: str, deep: int, is_last: bool):
-        if len(path) == 0:
-            name = '(?)'
-            is_finished = True
-        elif deep >= 10 or path in self.paths:
-            name = f'{path} (*)'
-            is_finished = True
-        else:
-            name = path
-            is_finished = False
-
-        if is_last:
-            tag = DependencyPrinter.END_TAG
+        self.graph.resolve(paths)
+        self.output.write('dependency\n')
+        for index, path in enumerate(paths):
+            self._print(path, index == len(paths) - 1)
+
+    def _print(self, root: str, is_last: bool):
+        stack = [(root, '', is_last, 0)]
+        while stack:
+            path, prefix, last, deep = stack.pop()
+            deps = None
+            if len(path) == 0:
+                name = '(?)'
+            elif (self.max_depth is not None and deep >= self.max_depth) or path in self.paths:
+                name = f'{path} (*)'
+            else:
+                name = path
+                self.paths.add(path)
+                deps = self.graph.dependencies(path)
+                if deps is None:
+                    deps = ['']
+
+            tag = DependencyPrinter.END_TAG if last else DependencyPrinter.ADD_TAG
+            self.output.write(prefix + tag + name + '\n')
+
+            if deps:
+                child_prefix = prefix + (DependencyPrinter.EMPTY_TAG if last else DependencyPrinter.CON_TAG)
+                for index in range(len(deps) - 1, -1, -1):
+                    stack.append((deps[index], child_prefix, index == len(deps) - 1, deep + 1))
+
+    def export(self, paths: list[str], output_format: str = 'tree'):
+        """
+        :param output_format: tree, json, dot, flat
+        """
+        if output_format == 'tree':
+            self.prints(paths)
+        elif output_format == 'json':
+            self.print_json(paths)
+        elif output_format == 'dot':
+            self.print_dot(paths)
+        elif output_format == 'flat':
+            self.print_flat(paths)
         else:
-            tag = DependencyPrinter.ADD_TAG
-        print(''.join(self.tags) + tag + name)
-
-        if is_finished:
-            return
+            raise ValueError(f'unknown format: {output_format}')
 
-        self.paths.append(path)
-        impl = MavenImplementation(self.host, path)
-        impl.sync_metadata(False)
-        impl.sync_pom(is_download=False)
+    def print_json(self, paths: list[str]):
+        nodes = {path: self.graph.nodes.get(path) for path in self.graph.reachable(paths)}
+        json.dump({'roots': paths, 'nodes': nodes}, self.output, indent=2)
+        self.output.write('\n')
 
-        if not impl.pom:
-            if is_last:
-                self.tags.append(DependencyPrinter.EMPTY_TAG)
-            else:
-                self.tags.append(DependencyPrinter.CON_TAG)
-            self._print('', deep + 1, True)
-            self.tags.pop()
-            return
+    def print_dot(self, paths: list[str]):
+        self.output.write('digraph dependency {\n')
+        for path in self.graph.reachable(paths):
+            deps = self.graph.nodes.get(path)
+            if deps is None:
+                self.output.write(f'  "{path}" [style=dashed];\n')
+                continue
+            for depe_path in deps:
+                self.output.write(f'  "{path}" -> "{depe_path}";\n')
+        self.output.write('}\n')
 
-        depe_list = impl.pom.maven_dependencies()
-        for depe in depe_list:
-            last = depe == depe_list[-1]
-            depe_path = ":".join([depe.group_id, depe.artifact_id, depe.version])
-            if is_last:
-                self.tags.append(DependencyPrinter.EMPTY_TAG)
-            else:
-                self.tags.append(DependencyPrinter.CON_TAG)
-            self._print(depe_path, deep + 1, last)
-            self.tags.pop()
+    def print_flat(self, paths: list[str]):
+        for path in sorted(self.graph.reachable(paths)):
+            self.output.write(path + '\n')
 
 
 if __name__ == '__main__':
-    maven_hosts = [
-        {'uri': 'https://maven.scijava.org/content/repositories/public/'},
-        {'uri': 'https://jfrog.anythinktech.com/artifactory/overseas_sdk/'},
-        {
-            'uri': 'https://maven.cherrysoft.cn/repository/maven-releases/',
-            'credentials': {
-                'username': 'develop',
-                'password': 'qwert12345'
-            }
-        },
-        # {'uri': 'https://maven.singular.net/'},
-        {'uri': 'https://artifact.bytedance.com/repository/pangle/'},
-        {'uri': 'https://maven.google.com/'},
-        {'uri': 'https://dl.google.com/dl/android/maven2/'},
-        {'uri': 'https://repo1.maven.org/maven2/'},
-        {'uri': 'https://jcenter.bintray.com/'},
-        {'uri': 'https://jitpack.io/'},
-        {'uri': 'https://maven.scijava.org/content/repositories/public/'},
-        {'uri': 'https://dl-maven-android.mintegral.com/repository/mbridge_android_sdk_oversea/'},
-        {'uri': 'https://maven.scijava.org/content/repositories/public/'},
-        {'uri': 'https://maven.aliyun.com/repository/google/'},
-        {'uri': 'https://maven.aliyun.com/repository/public/'},
-        {'uri': 'https://mvnrepository.com/'},
-    ]
+    maven_hosts = MAVEN_HOSTS
 
     storage = '.m'
-    syncer = MavenSyncer(MavenHost(hosts=maven_hosts, store_dir=storage), sync_depe=False)
+    syncer = MavenSyncer(MavenHost(hosts=maven_hosts, store_dir=storage,
+                                   checksum_mode=MavenChecksumPolicy.SINGLE), sync_depe=False)
     # syncer.sync("com.thinkup.sdk:core-tpn:6.5.31")
     # syncer.sync("com.thinkup.sdk:nativead-tpn:6.5.31")
     # syncer.sync("com.thinkup.sdk:banner-tpn:6.5.31")
@@ -551,3 +1519,5 @@ if __name__ == '__main__':
     # syncer.sync("com.pangle.global:ads-sdk-m:6.5.7.9")
 
     syncer.sync("com.adjust.sdk:adjust-android-v2:5.5.0")
+    syncer.host.sessions.print_stats()
+    maven_model_cache.print_stats()
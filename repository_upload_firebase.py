@@ -1,7 +1,6 @@
 from xml.dom import minidom
 
-import requests
-from requests.auth import HTTPBasicAuth
+from repository_publish import MavenComponent, MavenPublisher
 
 XML_NAMESPACE = 'http://maven.apache.org/POM/4.0.0'
 XSI_NAMESPACE = 'http://www.w3.org/2001/XMLSchema-instance'
@@ -59,7 +58,8 @@ def create_maven_pom(group_id_v: str, artifact_id_v: str, version_v: str, packag
 
 
 def upload_aar():
-    repository_url = 'https://maven.cherrysoft.cn/service/rest/v1/components?repository=maven-releases'
+    repository_uri = 'https://maven.cherrysoft.cn/'
+    repository = 'maven-releases'
     username = 'develop'
     password = 'qwert12345'
 
@@ -69,23 +69,14 @@ def upload_aar():
     aar_file_path = '/Users/zhouzhenliang/Desktop/temp-game/firebase-app-unity-12.5.0.aar'
     pom_file_path = '/Users/zhouzhenliang/Desktop/temp-game/firebase-app-unity-12.5.0.pom'
 
-    artifact_file = open(aar_file_path, 'rb')
-    pom_file = open(pom_file_path, 'rb')
-
-    # 准备要上传的文件
-    files = {
-        'maven2.asset1': artifact_file,
-        'maven2.asset1.extension': (None, 'aar'),
-        'maven2.asset2': pom_file,
-        'maven2.asset2.extension': (None, 'pom'),
-        'maven2.groupId': (None, group_id),
-        'maven2.artifactId': (None, artifact_id),
-        'maven2.version': (None, version),
-    }
-
-    # 通过 HTTP POST 上传 AAR 文件
-    response = requests.post(repository_url, files=files, auth=HTTPBasicAuth(username, password))
-    print(f'code: {response.status_code}, {response.text}')
+    # 增量发布, 远程已有相同内容时跳过
+    component = MavenComponent(group_id, artifact_id, version,
+                               [(aar_file_path, 'aar', ''), (pom_file_path, 'pom', '')])
+    publisher = MavenPublisher(repository_uri, repository, username, password, manifest_path='.publish.json')
+    try:
+        publisher.publish(component)
+    finally:
+        publisher.close()
 
 
 if __name__ == '__main__':
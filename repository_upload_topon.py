@@ -1,8 +1,12 @@
-import os
 from xml.dom import minidom
 
-import requests
-from requests.auth import HTTPBasicAuth
+from repository_publish import MavenComponent, MavenPublisher, scan_components
+
+REPOSITORY_URI = 'https://maven.cherrysoft.cn/'
+REPOSITORY_NAME = 'mediation-sdk'
+USERNAME = 'develop'
+PASSWORD = 'qwert12345'
+PUBLISH_MANIFEST = '.m/.publish.json'
 
 XML_NAMESPACE = 'http://maven.apache.org/POM/4.0.0'
 XSI_NAMESPACE = 'http://www.w3.org/2001/XMLSchema-instance'
@@ -60,48 +64,25 @@ def create_maven_pom(group_id_v: str, artifact_id_v: str, version_v: str, packag
 
 
 def upload_aar(group_id: str, artifact_id: str, version: str, aar_path: str, pom_path: str):
-    repository_url = 'https://maven.cherrysoft.cn/service/rest/v1/components?repository=mediation-sdk'
-    username = 'develop'
-    password = 'qwert12345'
-
-    artifact_file = open(aar_path, 'rb')
-    pom_file = open(pom_path, 'rb')
-
-    # 准备要上传的文件
-    files = {
-        'maven2.asset1': artifact_file,
-        'maven2.asset1.extension': (None, 'aar'),
-        'maven2.asset2': pom_file,
-        'maven2.asset2.extension': (None, 'pom'),
-        'maven2.groupId': (None, group_id),
-        'maven2.artifactId': (None, artifact_id),
-        'maven2.version': (None, version),
-    }
-
-    # 通过 HTTP POST 上传 AAR 文件
-    response = requests.post(repository_url, files=files, auth=HTTPBasicAuth(username, password))
-    print(f'code: {response.status_code}, {response.text}')
+    component = MavenComponent(group_id, artifact_id, version, [(aar_path, 'aar', ''), (pom_path, 'pom', '')])
+    publisher = MavenPublisher(REPOSITORY_URI, REPOSITORY_NAME, USERNAME, PASSWORD, max_workers=1,
+                               manifest_path=PUBLISH_MANIFEST)
+    try:
+        publisher.publish(component)
+    finally:
+        publisher.close()
 
 
-def upload_aars():
-    m_path = '.m/'
-    for root, dirs, files in os.walk(m_path):
-        root_dir = root[len(m_path):]
-        for file in files:
-            if file.endswith('.aar'):
-                aar_path = m_path + os.path.join(root_dir, file)
-                pom_path = m_path + os.path.join(root_dir, file.replace('.aar', '.pom'))
-
-                paths = root_dir.split('/')
-                version = paths[len(paths) - 1]
-                artifact_id = paths[len(paths) - 2]
-                group_id = '.'.join(paths[:len(paths) - 2])
-                print(f'version = {version}')
-                print(f'artifact_id = {artifact_id}')
-                print(f'group_id = {group_id}')
-                print(f'aar_path = {aar_path}')
-                print(f'pom_path = {pom_path}')
-                upload_aar(group_id, artifact_id, version, aar_path, pom_path)
+def upload_aars(max_workers: int = 4):
+    """
+    并发上传.m中所有带pom的aar, 已发布且未变化的跳过, 见MavenPublisher
+    """
+    publisher = MavenPublisher(REPOSITORY_URI, REPOSITORY_NAME, USERNAME, PASSWORD, max_workers=max_workers,
+                               manifest_path=PUBLISH_MANIFEST)
+    try:
+        publisher.uploads(scan_components('.m', ('aar',)), incremental=True)
+    finally:
+        publisher.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+
+class MavenValidatorStore:
+    """
+    记录文件来源仓库源及ETag/Last-Modified, 用于条件请求重新验证
+    :param store_path: 持久化文件, 为空时只在内存中生效
+    """
+
+    def __init__(self, store_path: str | None = None):
+        self.store_path = store_path
+        self.validators: dict[str, dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def get(self, relative_path: str) -> dict | None:
+        with self._lock:
+            return self.validators.get(relative_path)
+
+    def put(self, relative_path: str, uri: str, etag: str | None, last_modified: str | None):
+        validator = {'uri': uri, 'etag': etag or '', 'last_modified': last_modified or ''}
+        with self._lock:
+            if self.validators.get(relative_path) != validator:
+                self.validators[relative_path] = validator
+                self._dirty = True
+
+    @staticmethod
+    def headers(validator: dict) -> dict[str, str]:
+        """
+        条件请求头
+        """
+        headers = {}
+        if validator.get('etag'):
+            headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'):
+            headers['If-Modified-Since'] = validator['last_modified']
+        return headers
+
+    def load(self):
+        if not self.store_path or not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'warning: load validators fail {self.store_path}, {e}')
+            return
+        with self._lock:
+            self.validators = data
+
+    def save(self):
+        if not self.store_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = dict(self.validators)
+            self._dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+        temp_path = self.store_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.store_path)
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from repository_sync import MavenHost
+
+# 与Maven ComparableVersion一致:
+# alpha < beta < milestone < rc < snapshot < 正式版 < sp < 其他限定符 < 数字
+QUALIFIER_RANKS = {'alpha': 0, 'beta': 1, 'milestone': 2, 'rc': 3, 'snapshot': 4, '': 5, 'sp': 6}
+QUALIFIER_ALIASES = {'a': 'alpha', 'b': 'beta', 'm': 'milestone', 'cr': 'rc',
+                     'ga': '', 'final': '', 'release': ''}
+UNKNOWN_QUALIFIER_RANK = 7
+NUMBER_RANK = 8
+VERSION_TOKEN_PATTERN = re.compile(r'\d+|[a-zA-Z]+')
+VERSION_RESTRICTION_PATTERN = re.compile(r'([\[(])([^\[\]()]*)([])])')
+
+_RELEASE_ITEM = (QUALIFIER_RANKS[''], 0, '')
+
+
+@lru_cache(maxsize=65536)
+def maven_version_key(version: str) -> tuple:
+    """
+    版本排序键, 解析一次后缓存, 可直接比较大小
+    数字按数值比较, 1.0 == 1, 1.0-final == 1,
+    1.0-alpha1 < 1.0-rc1 < 1.0-SNAPSHOT < 1.0 < 1.0-sp1 < 1.0.1
+    """
+    items = []
+    for token in VERSION_TOKEN_PATTERN.findall(version.lower()):
+        if token.isdigit():
+            items.append((NUMBER_RANK, int(token), ''))
+            continue
+        token = QUALIFIER_ALIASES.get(token, token)
+        # 限定符前的0与省略等价: 1.0-alpha == 1-alpha
+        while items and items[-1] == (NUMBER_RANK, 0, ''):
+            items.pop()
+        if token in QUALIFIER_RANKS.keys():
+            if token:
+                items.append((QUALIFIER_RANKS[token], 0, ''))
+        else:
+            items.append((UNKNOWN_QUALIFIER_RANK, 0, token))
+    while items and items[-1] == (NUMBER_RANK, 0, ''):
+        items.pop()
+    # 结尾补一个正式版标记, 使1 > 1-alpha, 1 < 1-sp, 1 < 1.1
+    items.append(_RELEASE_ITEM)
+    return tuple(items)
+
+
+def maven_is_range(version: str) -> bool:
+    return version.startswith(('[', '('))
+
+
+def maven_normalize_version(version: str) -> str:
+    """
+    [1.0]只匹配1.0, 直接作为普通版本, 其余范围保持原样
+    """
+    result = VERSION_RESTRICTION_PATTERN.fullmatch(version)
+    if result and result.group(1) == '[' and result.group(3) == ']' and ',' not in result.group(2):
+        return result.group(2).strip()
+    return version
+
+
+class MavenVersionRange:
+    """
+    Maven版本范围: [1.0,2.0), (,1.0], [1.5,), [1.0], 多个范围用逗号连接表示并集
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        # (下限, 包含下限, 上限, 包含上限), 下限/上限为None表示不限
+        self.restrictions: list[tuple[str | None, bool, str | None, bool]] = []
+        for result in VERSION_RESTRICTION_PATTERN.finditer(spec):
+            lower_inclusive = result.group(1) == '['
+            upper_inclusive = result.group(3) == ']'
+            bounds = result.group(2).split(',')
+            if len(bounds) == 1:
+                version = bounds[0].strip()
+                self.restrictions.append((version, True, version, True))
+            else:
+                lower = bounds[0].strip() or None
+                upper = bounds[1].strip() or None
+                self.restrictions.append((lower, lower_inclusive, upper, upper_inclusive))
+
+    def contains(self, version: str) -> bool:
+        key = maven_version_key(version)
+        for lower, lower_inclusive, upper, upper_inclusive in self.restrictions:
+            if lower is not None:
+                lower_key = maven_version_key(lower)
+                if key < lower_key or (key == lower_key and not lower_inclusive):
+                    continue
+            if upper is not None:
+                upper_key = maven_version_key(upper)
+                if key > upper_key or (key == upper_key and not upper_inclusive):
+                    continue
+            return True
+        return False
+
+    def select(self, versions: list[str]) -> str | None:
+        """
+        :return: 范围内的最高版本
+        """
+        matches = [version for version in versions if self.contains(version)]
+        return max(matches, key=maven_version_key) if matches else None
+
+
+def maven_select_version(spec: str, versions: list[str]) -> str | None:
+    """
+    普通版本直接返回, 版本范围在可用版本(maven-metadata.xml)中取最高的匹配版本
+    """
+    if not maven_is_range(spec):
+        return spec
+    return MavenVersionRange(spec).select(versions)
+
+
+class MavenVersionResolver:
+    """
+    依赖版本仲裁, 在下载artifact之前为每个group:artifact确定唯一版本,
+    只下载metadata和被选中版本的pom
+    nearest: Maven规则, 依赖树中离根节点最近的版本优先, 同一深度先声明者优先,
+             落选版本的pom不会下载
+    highest: Gradle规则, 取请求中的最高版本,
+             版本范围在可用版本中取最高的匹配版本;
+             版本只升不降, 按层遍历时暂时被选中又被更高版本替换的节点,
+             其依赖请求仍然计入
+    根节点版本固定不参与仲裁
+    :param host: maven仓库源
+    :param strategy: NEAREST | HIGHEST
+    :param max_workers: 同一层并发解析的节点数
+    """
+    NEAREST = 'nearest'
+    HIGHEST = 'highest'
+
+    def __init__(self, host: MavenHost, strategy: str = HIGHEST, max_workers: int = 1):
+        assert strategy in (MavenVersionResolver.NEAREST, MavenVersionResolver.HIGHEST)
+        self.host = host
+        self.strategy = strategy
+        self.max_workers = max_workers
+        self.selected: dict[tuple[str, str], str] = {}
+        self.requested: dict[tuple[str, str], dict[str, None]] = {}
+        self._pinned: set[tuple[str, str]] = set()
+        self._dependencies: dict[str, list[str]] = {}
+        self._versions: dict[tuple[str, str], list[str]] = {}
+
+    def resolve(self, roots: list[str]) -> dict[tuple[str, str], str]:
+        """
+        按层遍历依赖图, 每层先确定版本再解析被选中版本的pom
+        :return: {(groupId, artifactId): version}
+        """
+        start_time = time.time()
+        level = []
+        for root in roots:
+            group_id, artifact_id, version = root.split(':', 2)
+            self.selected[(group_id, artifact_id)] = version
+            self._pinned.add((group_id, artifact_id))
+            level.append((group_id, artifact_id))
+        visited: set[str] = set()
+        while level:
+            paths = [path for path in dict.fromkeys(self._selected_path(key) for key in level)
+                     if path not in visited]
+            visited.update(paths)
+            self._load(paths)
+            next_level: dict[tuple[str, str], None] = {}
+            for path in paths:
+                for depe_path in self._dependencies.get(path, []):
+                    group_id, artifact_id, version = depe_path.split(':', 2)
+                    key = (group_id, artifact_id)
+                    self.requested.setdefault(key, {})[version] = None
+                    self._mediate(key, version)
+                    next_level[key] = None
+            level = list(next_level)
+        self._check_ranges()
+
+        evicted = sum(len(versions) for versions in self.requested.values()) - len(self.requested)
+        print(f'mediation: strategy={self.strategy} modules={len(self.selected)} evicted={evicted} '
+              f'poms={len(visited)} time={time.time() - start_time:.2f}s')
+        return self.selected
+
+    def select(self, path: str) -> str:
+        """
+        按仲裁结果替换依赖的版本, 未参与仲裁的保持原样
+        """
+        group_id, artifact_id, version = path.split(':', 2)
+        selected = self.selected.get((group_id, artifact_id))
+        return path if selected is None or selected == version else f'{group_id}:{artifact_id}:{selected}'
+
+    def _selected_path(self, key: tuple[str, str]) -> str:
+        return f'{key[0]}:{key[1]}:{self.selected[key]}'
+
+    def _mediate(self, key: tuple[str, str], version: str):
+        if key in self._pinned:
+            return
+        current = self.selected.get(key)
+        if current is not None and self.strategy == MavenVersionResolver.NEAREST:
+            return
+        if maven_is_range(version):
+            version = maven_select_version(version, self._available_versions(key)) or version
+            # 无法确定的范围不替换已有版本
+            if current is not None and maven_is_range(version):
+                return
+        if not current or maven_is_range(current):
+            self.selected[key] = version
+        elif version and not maven_is_range(version) and \
+                maven_version_key(version) > maven_version_key(current):
+            self.selected[key] = version
+
+    def _available_versions(self, key: tuple[str, str]) -> list[str]:
+        if key not in self._versions.keys():
+            # 延迟导入, repository_sync依赖本模块
+            from repository_sync import MavenImplementation
+            impl = MavenImplementation(self.host, f'{key[0]}:{key[1]}:')
+            impl.sync_metadata()
+            self._versions[key] = list(impl.metadata.versions) if impl.metadata else []
+        return self._versions[key]
+
+    def _check_ranges(self):
+        for key, versions in self.requested.items():
+            selected = self.selected.get(key)
+            if not selected or maven_is_range(selected):
+                continue
+            for version in versions.keys():
+                if maven_is_range(version) and not MavenVersionRange(version).contains(selected):
+                    print(f'warning: {key[0]}:{key[1]}:{selected} not in requested range {version}')
+
+    def _load(self, paths: list[str]):
+        paths = [path for path in paths if path not in self._dependencies.keys()]
+        if self.max_workers > 1 and len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(self._load_node, paths))
+        else:
+            results = [self._load_node(path) for path in paths]
+        for path, deps in zip(paths, results):
+            self._dependencies[path] = deps
+
+    def _load_node(self, path: str) -> list[str]:
+        from repository_sync import MavenImplementation
+        impl = MavenImplementation(self.host, path)
+        impl.sync_metadata()
+        impl.sync_pom()
+        if not impl.pom:
+            return []
+        return [depe.path for depe in impl.pom.maven_dependencies()]
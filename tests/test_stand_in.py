@@ -0,0 +1,229 @@
+"""
+本地替身服务器: Range续传(故意中途断开连接)
+和Nexus components接口(流式multipart上传, 429重试)
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from repository_publish import MavenComponent, MavenMultipartStream, MavenPublisher
+from repository_sync import MavenHost, MavenSessionPool, MavenSyncer, maven_download_file
+
+RELATIVE_PATH = 'com/example/lib/1.0/lib-1.0.aar'
+PAYLOAD = os.urandom(256 * 1024 + 123)
+ETAG = '"v1"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    支持Range/If-Range, 前drops次完整响应只发送一半后断开连接
+    """
+    protocol_version = 'HTTP/1.1'
+    support_range = True
+    drops = 0
+    requests: list[dict] = []
+
+    def do_GET(self):
+        self.requests.append({'range': self.headers.get('Range'), 'if_range': self.headers.get('If-Range')})
+        start = 0
+        range_value = self.headers.get('Range', '')
+        if self.support_range and range_value.startswith('bytes=') and \
+                self.headers.get('If-Range') == ETAG:
+            start = int(range_value[len('bytes='):].rstrip('-'))
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(PAYLOAD)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}')
+        else:
+            self.send_response(200)
+        body = PAYLOAD[start:]
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if type(self).drops > 0:
+            type(self).drops -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ComponentsHandler(BaseHTTPRequestHandler):
+    """
+    Nexus POST service/rest/v1/components替身, 解析multipart请求体, 第一次请求返回429
+    """
+    protocol_version = 'HTTP/1.1'
+    throttles = 1
+    uploads: list[dict] = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if type(self).throttles > 0:
+            type(self).throttles -= 1
+            self._reply(429, {'Retry-After': '0'})
+            return
+        message = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode() + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            fields[name] = part.get_payload(decode=True)
+        self.uploads.append({'length': len(body), 'fields': fields})
+        self._reply(204)
+
+    def do_GET(self):
+        # 远程.sha1不存在
+        self._reply(404)
+
+    def _reply(self, status: int, headers: dict[str, str] | None = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(handler: type[BaseHTTPRequestHandler]):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def range_server():
+    handler = type('Handler', (RangeHandler,), {'requests': []})
+    server = _serve(handler)
+    yield handler, {'uri': f'http://127.0.0.1:{server.server_port}/'}
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def components_server():
+    handler = type('Handler', (ComponentsHandler,), {'uploads': []})
+    server = _serve(handler)
+    yield handler, f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+    server.server_close()
+
+
+def _download(engine: str, host: dict, store_dir: str):
+    if engine == MavenSyncer.ENGINE_THREAD:
+        return maven_download_file(host, store_dir, RELATIVE_PATH, MavenSessionPool(retries=0))
+    pytest.importorskip('aiohttp')
+    from repository_async import MavenAsyncEngine
+
+    async def run():
+        engine = MavenAsyncEngine(MavenSyncer(MavenHost([host], store_dir, retries=0)))
+        try:
+            return await engine.download_file(host, RELATIVE_PATH)
+        finally:
+            await engine.close()
+    return asyncio.run(run())
+
+
+def _assert_downloaded(download, store_dir: str):
+    local_path = os.path.join(store_dir, RELATIVE_PATH)
+    assert download
+    assert download.digests['sha1'] == hashlib.sha1(PAYLOAD).hexdigest()
+    with open(local_path, 'rb') as file:
+        assert file.read() == PAYLOAD
+    assert not os.path.exists(local_path + '.part')
+    assert not os.path.exists(local_path + '.part.json')
+
+
+@pytest.mark.parametrize('engine', [MavenSyncer.ENGINE_THREAD, MavenSyncer.ENGINE_ASYNCIO])
+def test_resume_after_dropped_connection(range_server, tmp_path, engine):
+    handler, host = range_server
+    handler.drops = 1
+    store_dir = str(tmp_path)
+    local_path = os.path.join(store_dir, RELATIVE_PATH)
+
+    assert not _download(engine, host, store_dir)
+    assert not os.path.exists(local_path)
+    offset = os.path.getsize(local_path + '.part')
+    assert 0 < offset < len(PAYLOAD)
+
+    _assert_downloaded(_download(engine, host, store_dir), store_dir)
+    assert handler.requests[-1] == {'range': f'bytes={offset}-', 'if_range': ETAG}
+
+
+def test_full_fetch_when_range_unsupported(range_server, tmp_path):
+    handler, host = range_server
+    handler.drops = 1
+    handler.support_range = False
+    store_dir = str(tmp_path)
+
+    assert not _download(MavenSyncer.ENGINE_THREAD, host, store_dir)
+    _assert_downloaded(_download(MavenSyncer.ENGINE_THREAD, host, store_dir), store_dir)
+    assert handler.requests[-1]['range'] is not None
+
+
+def test_restart_when_part_does_not_match(range_server, tmp_path):
+    handler, host = range_server
+    store_dir = str(tmp_path)
+    local_path = os.path.join(store_dir, RELATIVE_PATH)
+    os.makedirs(os.path.dirname(local_path))
+    with open(local_path + '.part', 'wb') as file:
+        file.write(b'x' * (len(PAYLOAD) + 1))
+    with open(local_path + '.part.json', 'w') as file:
+        json.dump({'url': host['uri'] + RELATIVE_PATH, 'etag': ETAG, 'last_modified': ''}, file)
+
+    _assert_downloaded(_download(MavenSyncer.ENGINE_THREAD, host, store_dir), store_dir)
+    assert [request['range'] for request in handler.requests] == [f'bytes={len(PAYLOAD) + 1}-', None]
+
+
+def test_multipart_stream_matches_length(tmp_path):
+    aar_path = tmp_path / 'lib-1.0.aar'
+    aar_path.write_bytes(PAYLOAD)
+    component = MavenComponent('com.example', 'lib', '1.0',
+                               [(str(aar_path), 'aar', ''), (b'<project/>', 'pom', '')])
+    with MavenMultipartStream(component.fields()) as stream:
+        chunks = list(stream)
+    assert max(len(chunk) for chunk in chunks) < len(PAYLOAD)
+    assert sum(len(chunk) for chunk in chunks) == len(stream)
+
+
+def test_upload_retries_throttled_request_with_full_body(components_server, tmp_path):
+    handler, uri = components_server
+    aar_path = tmp_path / 'lib-1.0.aar'
+    aar_path.write_bytes(PAYLOAD)
+    pom = b'<project/>'
+    component = MavenComponent('com.example', 'lib', '1.0', [(str(aar_path), 'aar', ''), (pom, 'pom', '')])
+    publisher = MavenPublisher(uri, 'releases', max_workers=2, retries=0)
+    try:
+        stats = publisher.uploads([component])
+    finally:
+        publisher.close()
+
+    assert handler.throttles == 0
+    assert stats['uploaded'] == 1 and stats['failed'] == 0
+    assert len(handler.uploads) == 1
+    upload = handler.uploads[0]
+    assert stats['bytes'] == upload['length'] == len(MavenMultipartStream(component.fields()))
+    fields = upload['fields']
+    assert fields['maven2.groupId'] == b'com.example'
+    assert fields['maven2.asset1'] == PAYLOAD
+    assert fields['maven2.asset1.extension'] == b'aar'
+    assert fields['maven2.asset2'] == pom